@@ -0,0 +1,52 @@
+# Compare two bench.run reports, e.g. before and after a change to main.py:
+#
+#     python -m bench.compare bench/results/base.json bench/results/head.json
+import argparse
+import json
+
+METRICS = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def change(before, after):
+    if before is None or after is None:
+        return 'n/a'
+    if before == 0:
+        return '—'
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def compare(base, head):
+    """Rows of (scenario, metric, base value, head value, relative change)"""
+    rows = []
+    for name in head['scenarios']:
+        if name not in base['scenarios']:
+            continue
+        for metric in METRICS:
+            before = base['scenarios'][name].get(metric)
+            after = head['scenarios'][name].get(metric)
+            rows.append((name, metric, before, after, change(before, after)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two bench.run JSON reports.')
+    parser.add_argument('base')
+    parser.add_argument('head')
+    args = parser.parse_args()
+
+    with open(args.base) as handle:
+        base = json.load(handle)
+    with open(args.head) as handle:
+        head = json.load(handle)
+
+    for key in ('dataset', 'concurrency', 'duration', 'bust_cache', 'target'):
+        if base.get(key) != head.get(key):
+            print(f'warning: {key} differs ({base.get(key)!r} vs {head.get(key)!r})')
+
+    print(f"{'scenario':<18} {'metric':<15} {'base':>12} {'head':>12} {'change':>9}")
+    for name, metric, before, after, relative in compare(base, head):
+        print(f'{name:<18} {metric:<15} {before!s:>12} {after!s:>12} {relative:>9}')
+
+
+if __name__ == '__main__':
+    main()
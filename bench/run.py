@@ -0,0 +1,231 @@
+# Drive the Flask API at a fixed concurrency and report latency percentiles.
+#
+# Run from the repository root against a dataset made by bench.generate:
+#
+#     gunicorn -c gunicorn.conf.py &                      # with DB_* pointing at the dataset
+#     python -m bench.run --base-url http://127.0.0.1:8000 --output bench/results/$(git rev-parse --short HEAD).json
+#
+#     python -m bench.run --in-process                    # no server: WSGI calls into create_app()
+#
+# Each scenario runs for --duration seconds after a --warmup period with
+# --concurrency workers, each on its own keep-alive connection. Request
+# parameters come from a seeded RNG, so runs with the same --seed issue the
+# same requests. --bust-cache adds a unique argument to every request so
+# the response cache is bypassed and the database path is measured.
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+from .generate import CATEGORIES, SCALES, WORDS, dataset_sizes, database_config, default_urls, load_locations
+
+PAGE_SIZE = 12
+
+
+def scenarios(activities):
+    """{name: function(rng) -> request path} for a dataset of this many activities"""
+    locations = load_locations()
+    deepest_page = max(activities // PAGE_SIZE, 1)
+
+    def activities_path(**args):
+        return '/api/activities?' + urlencode(args)
+
+    return {
+        'list': lambda rng: activities_path(page=1),
+        'search': lambda rng: activities_path(search=rng.choice(WORDS)),
+        'search_two_terms': lambda rng: activities_path(search=f'{rng.choice(WORDS)} {rng.choice(WORDS)}'),
+        'filter': lambda rng: activities_path(
+            category=rng.choice(CATEGORIES), suburb=rng.choice(locations)[0]
+        ),
+        'age': lambda rng: activities_path(age=rng.randint(0, 17)),
+        'near': lambda rng: activities_path(near=rng.choice(locations)[1], radius_km=10),
+        'deep_page': lambda rng: activities_path(page=rng.randint(deepest_page // 2, deepest_page)),
+        'cursor': lambda rng: activities_path(after=rng.randint(1, activities), include_total=0),
+        'sort_rating': lambda rng: activities_path(sort='rating', page=rng.randint(1, 20)),
+        'detail': lambda rng: f'/api/activity/{rng.randint(1, activities)}',
+    }
+
+
+class HTTPTransport:
+    """One keep-alive connection to a running server"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+
+    def get(self, path):
+        try:
+            self.connection.request('GET', self.prefix + path, headers={'Accept-Encoding': 'gzip, br'})
+            response = self.connection.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            self.connection.close()
+            raise
+
+
+class WSGITransport:
+    """Calls straight into the app, for runs without a server"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        response = self.client.get(path, headers={'Accept-Encoding': 'gzip, br'})
+        response.close()
+        return response.status_code
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not ordered:
+        return None
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def run_scenario(name, make_path, transport_factory, concurrency, duration, warmup, seed, bust_cache):
+    latencies = [[] for _ in range(concurrency)]
+    statuses = [{} for _ in range(concurrency)]
+    errors = [0] * concurrency
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+
+    def worker(index):
+        rng = random.Random(f'{seed}:{name}:{index}')
+        transport = transport_factory()
+        sequence = 0
+        while True:
+            path = make_path(rng)
+            if bust_cache:
+                sequence += 1
+                path += ('&' if '?' in path else '?') + f'bench={seed}.{index}.{sequence}.{time.time_ns()}'
+            started = time.perf_counter()
+            if started >= stop_at:
+                break
+            try:
+                status = transport.get(path)
+            except Exception:
+                status = None
+            finished = time.perf_counter()
+            if started < start_at:
+                continue
+            if status is None:
+                errors[index] += 1
+                transport = transport_factory()
+                continue
+            statuses[index][status] = statuses[index].get(status, 0) + 1
+            latencies[index].append(finished - started)
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ordered = sorted(latency for worker_latencies in latencies for latency in worker_latencies)
+    status_counts = {}
+    for worker_statuses in statuses:
+        for status, count in worker_statuses.items():
+            status_counts[str(status)] = status_counts.get(str(status), 0) + count
+
+    def milliseconds(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        'requests': len(ordered),
+        'throughput_rps': round(len(ordered) / duration, 2),
+        'p50_ms': milliseconds(percentile(ordered, 0.50)),
+        'p95_ms': milliseconds(percentile(ordered, 0.95)),
+        'p99_ms': milliseconds(percentile(ordered, 0.99)),
+        'max_ms': milliseconds(ordered[-1] if ordered else None),
+        'mean_ms': milliseconds(sum(ordered) / len(ordered) if ordered else None),
+        'statuses': status_counts,
+        'errors': sum(errors),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    default_users_url, default_app_url = default_urls()
+    parser = argparse.ArgumentParser(description='Benchmark the KidsSmart Flask API.')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000', help='Server to drive')
+    parser.add_argument('--in-process', action='store_true', help='Call create_app() directly instead of a server')
+    parser.add_argument('--users-url', default=default_users_url, help='Users database for --in-process')
+    parser.add_argument('--app-url', default=default_app_url, help='App database for --in-process')
+    parser.add_argument('--scale', choices=SCALES, default='10k', help='Scale the dataset was generated at')
+    parser.add_argument('--activities', type=int, help='Exact number of activities in the dataset')
+    parser.add_argument('--scenario', action='append', help='Scenario to run (repeatable; default all)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='Measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Unmeasured seconds before each scenario')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--bust-cache', action='store_true', help='Make every request miss the response cache')
+    parser.add_argument('--output', help='Write the JSON report here as well as to stdout')
+    args = parser.parse_args()
+
+    activities = args.activities or SCALES[args.scale]
+    available = scenarios(activities)
+    selected = args.scenario or list(available)
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        parser.error(f"unknown scenario(s) {', '.join(unknown)}; choose from {', '.join(available)}")
+
+    if args.in_process:
+        from main import create_app
+
+        app = create_app(database_config(args.users_url, args.app_url))
+        target = 'in-process'
+
+        def transport_factory():
+            return WSGITransport(app)
+    else:
+        target = args.base_url
+
+        def transport_factory():
+            return HTTPTransport(args.base_url)
+
+    report = {
+        'commit': git_commit(),
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'target': target,
+        'dataset': dataset_sizes(activities),
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'seed': args.seed,
+        'bust_cache': args.bust_cache,
+        'scenarios': {},
+    }
+    for name in selected:
+        report['scenarios'][name] = run_scenario(
+            name, available[name], transport_factory, args.concurrency,
+            args.duration, args.warmup, args.seed, args.bust_cache
+        )
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
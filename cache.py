@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """TTL cache kept in a SQLite file so every worker process on a host shares it.
+
+    Values must be bytes (serialised response bodies) and are stored as
+    they are, so nothing read back from the file is unpickled. Expired
+    entries, and once the cache holds more than ``maxsize`` entries the ones
+    closest to expiry, are pruned every ``PRUNE_EVERY`` writes.
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, path, maxsize=1024, ttl=60):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        connection = self._connection()
+        # Not cache_entries, whose values were pickled and must not be served
+        # as bodies from a file written by an older release
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache_blobs ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)'
+        )
+        connection.execute(
+            'CREATE INDEX IF NOT EXISTS idx_cache_blobs_expires ON cache_blobs (expires_at)'
+        )
+
+    def _connection(self):
+        # SQLite connections must not cross a fork, so key them by process too
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key, default=None):
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM cache_blobs WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return default
+        value, expires_at = row
+        if expires_at <= time.time():
+            self.delete(key)
+            return default
+        return value
+
+    def set(self, key, value, ttl=None):
+        if not isinstance(value, bytes):
+            raise TypeError(f'SQLiteCache values must be bytes, not {type(value).__name__}')
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        connection = self._connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache_blobs (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, value, expires_at)
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune(connection)
+
+    def _prune(self, connection):
+        connection.execute(
+            'DELETE FROM cache_blobs WHERE expires_at <= ? OR key IN ('
+            'SELECT key FROM cache_blobs ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+            (time.time(), self.maxsize)
+        )
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache_blobs WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_blobs')
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM cache_blobs').fetchone()[0]
+
+
+def create_cache(backend='memory', path=None, maxsize=1024, ttl=60):
+    """Build a cache for the configured backend ('memory' or 'sqlite')"""
+    if backend == 'memory':
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(path, maxsize=maxsize, ttl=ttl)
+    raise ValueError(f'Unknown cache backend: {backend}')
@@ -0,0 +1,18 @@
+USE kidssmart_app;
+
+-- Full-text index used by the Flask /api/activities?search= endpoint.
+-- Replaces LIKE '%term%' scans over title/description with ranked
+-- MATCH ... AGAINST lookups.
+
+SET @sql = (SELECT IF(
+    (SELECT COUNT(*)
+     FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'kidssmart_app'
+     AND TABLE_NAME = 'activities'
+     AND INDEX_NAME = 'ft_activities_search') = 0,
+    "ALTER TABLE activities ADD FULLTEXT INDEX ft_activities_search (title, description)",
+    "SELECT 'Index ft_activities_search already exists'"
+));
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
@@ -0,0 +1,17 @@
+USE kidssmart_app;
+
+-- Index on updated_at so the Flask API can read MAX(updated_at) for its
+-- dataset version (response cache invalidation) without a table scan.
+
+SET @sql = (SELECT IF(
+    (SELECT COUNT(*)
+     FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'kidssmart_app'
+     AND TABLE_NAME = 'activities'
+     AND INDEX_NAME = 'idx_updated_at') = 0,
+    "ALTER TABLE activities ADD INDEX idx_updated_at (updated_at)",
+    "SELECT 'Index idx_updated_at already exists'"
+));
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
@@ -0,0 +1,18 @@
+USE kidssmart_app;
+
+-- Suburb/postcode centroids used by the Flask /api/activities?near= radius
+-- search. Load them with `flask load-locations` (defaults to
+-- database/data/locations.csv).
+
+SET @sql = (SELECT IF(
+    (SELECT COUNT(*)
+     FROM INFORMATION_SCHEMA.COLUMNS
+     WHERE TABLE_SCHEMA = 'kidssmart_app'
+     AND TABLE_NAME = 'locations'
+     AND COLUMN_NAME = 'latitude') = 0,
+    "ALTER TABLE locations ADD COLUMN latitude DECIMAL(9,6) NULL, ADD COLUMN longitude DECIMAL(9,6) NULL",
+    "SELECT 'Columns latitude/longitude already exist'"
+));
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
@@ -0,0 +1,18 @@
+USE kidssmart_app;
+
+-- Structured age bounds parsed from the free-text age_range column by the
+-- scraper pipeline (and kidssmart.backfill_age_ranges for existing rows).
+-- Open-ended ranges such as "3+" are stored with max_age = 99.
+
+SET @sql = (SELECT IF(
+    (SELECT COUNT(*)
+     FROM INFORMATION_SCHEMA.COLUMNS
+     WHERE TABLE_SCHEMA = 'kidssmart_app'
+     AND TABLE_NAME = 'activities'
+     AND COLUMN_NAME = 'min_age') = 0,
+    "ALTER TABLE activities ADD COLUMN min_age TINYINT UNSIGNED NULL AFTER age_range, ADD COLUMN max_age TINYINT UNSIGNED NULL AFTER min_age, ADD INDEX idx_age (min_age, max_age)",
+    "SELECT 'Columns min_age/max_age already exist'"
+));
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
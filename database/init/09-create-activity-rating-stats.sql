@@ -0,0 +1,123 @@
+USE kidssmart_app;
+
+-- Per-activity rating aggregates over approved reviews, read by
+-- /api/activities (?sort=rating, rating_* fields) instead of running
+-- AVG/COUNT over kidssmart_users.reviews per page. Kept current by the
+-- triggers on kidssmart_users.reviews below; `flask rebuild-rating-stats`
+-- recomputes it from scratch.
+--
+-- rating_score is a Bayesian average that pulls activities with few reviews
+-- towards a prior of 3.5 stars worth 5 reviews (see RATING_PRIOR_* in main.py).
+
+CREATE TABLE IF NOT EXISTS activity_rating_stats (
+    activity_id INT PRIMARY KEY,
+    rating_count INT NOT NULL DEFAULT 0,
+    rating_sum INT NOT NULL DEFAULT 0,
+    rating_avg DECIMAL(4,3) GENERATED ALWAYS AS (
+        CASE WHEN rating_count > 0 THEN rating_sum / rating_count END
+    ) STORED,
+    rating_score DECIMAL(4,3) GENERATED ALWAYS AS (
+        CASE WHEN rating_count > 0 THEN (rating_sum + 5 * 3.5) / (rating_count + 5) END
+    ) STORED,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_rating_score (rating_score),
+    INDEX idx_rating_updated_at (updated_at)
+);
+
+-- The triggers leave a row with rating_count = 0 when an activity's last
+-- approved review is removed; its score must then be NULL (unrated, sorted
+-- last) rather than the prior. Tables created before that was the case
+-- still compute the prior for it.
+SET @sql = (SELECT IF(
+    (SELECT COUNT(*)
+     FROM INFORMATION_SCHEMA.COLUMNS
+     WHERE TABLE_SCHEMA = 'kidssmart_app'
+     AND TABLE_NAME = 'activity_rating_stats'
+     AND COLUMN_NAME = 'rating_score'
+     AND LOWER(GENERATION_EXPRESSION) NOT LIKE '%case%') > 0,
+    "ALTER TABLE activity_rating_stats MODIFY rating_score DECIMAL(4,3) GENERATED ALWAYS AS (CASE WHEN rating_count > 0 THEN (rating_sum + 5 * 3.5) / (rating_count + 5) END) STORED",
+    "SELECT 'rating_score already NULL for unrated activities'"
+));
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+USE kidssmart_users;
+
+-- Each trigger removes the old row's contribution (if it was approved) and
+-- adds the new row's (if it is), which covers new reviews, edited ratings,
+-- approval changes and deletions.
+
+DROP TRIGGER IF EXISTS reviews_rating_stats_insert;
+DROP TRIGGER IF EXISTS reviews_rating_stats_update;
+DROP TRIGGER IF EXISTS reviews_rating_stats_delete;
+DROP TRIGGER IF EXISTS users_rating_stats_delete;
+
+DELIMITER //
+
+CREATE TRIGGER reviews_rating_stats_insert AFTER INSERT ON reviews
+FOR EACH ROW
+BEGIN
+    IF NEW.is_approved THEN
+        INSERT INTO kidssmart_app.activity_rating_stats (activity_id, rating_count, rating_sum)
+        VALUES (NEW.activity_id, 1, NEW.rating)
+        ON DUPLICATE KEY UPDATE
+            rating_count = rating_count + 1,
+            rating_sum = rating_sum + NEW.rating;
+    END IF;
+END//
+
+CREATE TRIGGER reviews_rating_stats_update AFTER UPDATE ON reviews
+FOR EACH ROW
+BEGIN
+    IF OLD.is_approved THEN
+        UPDATE kidssmart_app.activity_rating_stats
+        SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+        WHERE activity_id = OLD.activity_id;
+    END IF;
+    IF NEW.is_approved THEN
+        INSERT INTO kidssmart_app.activity_rating_stats (activity_id, rating_count, rating_sum)
+        VALUES (NEW.activity_id, 1, NEW.rating)
+        ON DUPLICATE KEY UPDATE
+            rating_count = rating_count + 1,
+            rating_sum = rating_sum + NEW.rating;
+    END IF;
+END//
+
+CREATE TRIGGER reviews_rating_stats_delete AFTER DELETE ON reviews
+FOR EACH ROW
+BEGIN
+    IF OLD.is_approved THEN
+        UPDATE kidssmart_app.activity_rating_stats
+        SET rating_count = rating_count - 1, rating_sum = rating_sum - OLD.rating
+        WHERE activity_id = OLD.activity_id;
+    END IF;
+END//
+
+-- Reviews removed by ON DELETE CASCADE when a user is deleted do not fire
+-- reviews triggers, so take the user's approved reviews out here first
+CREATE TRIGGER users_rating_stats_delete BEFORE DELETE ON users
+FOR EACH ROW
+BEGIN
+    UPDATE kidssmart_app.activity_rating_stats AS stats
+    JOIN (
+        SELECT activity_id, COUNT(*) AS review_count, SUM(rating) AS review_sum
+        FROM reviews
+        WHERE user_id = OLD.user_id AND is_approved
+        GROUP BY activity_id
+    ) AS removed ON removed.activity_id = stats.activity_id
+    SET stats.rating_count = stats.rating_count - removed.review_count,
+        stats.rating_sum = stats.rating_sum - removed.review_sum;
+END//
+
+DELIMITER ;
+
+-- Seed from reviews that already exist
+INSERT INTO kidssmart_app.activity_rating_stats (activity_id, rating_count, rating_sum)
+SELECT activity_id, COUNT(*), SUM(rating)
+FROM reviews
+WHERE is_approved
+GROUP BY activity_id
+ON DUPLICATE KEY UPDATE
+    rating_count = VALUES(rating_count),
+    rating_sum = VALUES(rating_sum);
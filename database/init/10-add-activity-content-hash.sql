@@ -0,0 +1,20 @@
+USE kidssmart_app;
+
+-- Fingerprint of an activity's scraped fields, written by the scraper
+-- pipeline (kidssmart/fingerprint.py). Re-scrapes compare against it and only
+-- UPDATE rows whose content changed, so updated_at moves only on real
+-- changes. Rows scraped before this column existed have NULL and are
+-- refreshed once on their next scrape.
+
+SET @sql = (SELECT IF(
+    (SELECT COUNT(*)
+     FROM INFORMATION_SCHEMA.COLUMNS
+     WHERE TABLE_SCHEMA = 'kidssmart_app'
+     AND TABLE_NAME = 'activities'
+     AND COLUMN_NAME = 'content_hash') = 0,
+    "ALTER TABLE activities ADD COLUMN content_hash CHAR(32) NULL AFTER source_name",
+    "SELECT 'Column content_hash already exists'"
+));
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
@@ -0,0 +1,51 @@
+USE kidssmart_app;
+
+-- Cross-source deduplication (`flask merge-duplicates`). Listings of the
+-- same provider from different spiders are merged into one canonical
+-- activity: the others keep their row, so re-scrapes still upsert on
+-- source_url, but get merged_into set and are hidden from the API.
+-- activity_sources records which scraped listings each activity came from.
+--
+-- Distinct providers may share a name in different suburbs, so the UNIQUE
+-- constraint on title is replaced by a plain (title, suburb) index.
+
+SET @sql = (SELECT IF(
+    (SELECT COUNT(*)
+     FROM INFORMATION_SCHEMA.STATISTICS
+     WHERE TABLE_SCHEMA = 'kidssmart_app'
+     AND TABLE_NAME = 'activities'
+     AND INDEX_NAME = 'title'
+     AND NON_UNIQUE = 0) > 0,
+    "ALTER TABLE activities DROP INDEX title, ADD INDEX idx_title_suburb (title, suburb)",
+    "SELECT 'Unique index on title already dropped'"
+));
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+SET @sql = (SELECT IF(
+    (SELECT COUNT(*)
+     FROM INFORMATION_SCHEMA.COLUMNS
+     WHERE TABLE_SCHEMA = 'kidssmart_app'
+     AND TABLE_NAME = 'activities'
+     AND COLUMN_NAME = 'merged_into') = 0,
+    "ALTER TABLE activities ADD COLUMN merged_into INT NULL AFTER is_approved, ADD INDEX idx_merged_into (merged_into)",
+    "SELECT 'Column merged_into already exists'"
+));
+PREPARE stmt FROM @sql;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
+
+CREATE TABLE IF NOT EXISTS activity_sources (
+    source_activity_id INT PRIMARY KEY,
+    activity_id INT NOT NULL,
+    source_name VARCHAR(100),
+    source_url VARCHAR(500),
+    similarity DECIMAL(4,3) NULL,
+    linked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_activity_sources_activity (activity_id)
+);
+
+INSERT IGNORE INTO activity_sources (source_activity_id, activity_id, source_name, source_url)
+SELECT activity_id, COALESCE(merged_into, activity_id), source_name, source_url
+FROM activities;
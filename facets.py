@@ -0,0 +1,52 @@
+from collections import Counter
+
+
+class FacetCube:
+    """Activity counts per (category, suburb, postcode, source_name) combination.
+
+    Built from one GROUP BY over the approved catalogue, then answers facet
+    counts for any combination of those filters without touching the
+    database. Each facet's counts honour every filter except its own, so a
+    sidebar can still offer the alternatives to the selected value.
+    """
+
+    DIMENSIONS = ('category', 'suburb', 'postcode', 'source_name')
+
+    def __init__(self, rows):
+        # rows: iterables of (category, suburb, postcode, source_name, count)
+        self.cells = [(tuple(row[:-1]), row[-1]) for row in rows]
+
+    def counts(self, filters=None):
+        filters = {
+            dimension: value for dimension, value in (filters or {}).items()
+            if dimension in self.DIMENSIONS and value
+        }
+        indexed_filters = [
+            (self.DIMENSIONS.index(dimension), value) for dimension, value in filters.items()
+        ]
+
+        facets = {dimension: Counter() for dimension in self.DIMENSIONS}
+        total = 0
+        for key, count in self.cells:
+            mismatched = [position for position, value in indexed_filters if key[position] != value]
+            if not mismatched:
+                total += count
+            if len(mismatched) > 1:
+                continue
+            for position, dimension in enumerate(self.DIMENSIONS):
+                # A cell failing only this facet's own filter still counts for it
+                if mismatched and mismatched[0] != position:
+                    continue
+                if key[position] not in (None, ''):
+                    facets[dimension][key[position]] += count
+
+        return {
+            'total': total,
+            'facets': {
+                dimension: [
+                    {'value': value, 'count': count}
+                    for value, count in sorted(counter.items(), key=lambda item: (-item[1], item[0]))
+                ]
+                for dimension, counter in facets.items()
+            }
+        }
@@ -0,0 +1,53 @@
+import math
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GeoGrid:
+    """Fixed-size lat/lon grid for radius queries over a set of points.
+
+    Points are bucketed into ``cell_degrees`` square cells, so a radius
+    query only measures the points in the cells overlapping the search
+    circle's bounding box instead of every point.
+    """
+
+    def __init__(self, points, cell_degrees=0.1):
+        # points: iterable of (key, latitude, longitude)
+        self.cell_degrees = cell_degrees
+        self.cells = defaultdict(list)
+        for key, latitude, longitude in points:
+            self.cells[self._cell(latitude, longitude)].append((key, latitude, longitude))
+
+    def _cell(self, latitude, longitude):
+        return (
+            math.floor(latitude / self.cell_degrees),
+            math.floor(longitude / self.cell_degrees)
+        )
+
+    def within(self, latitude, longitude, radius_km):
+        """Return [(key, distance_km)] for points within radius_km, nearest first"""
+        lat_span = radius_km / 111.0
+        lon_span = radius_km / (111.0 * max(math.cos(math.radians(latitude)), 0.01))
+        min_row, min_col = self._cell(latitude - lat_span, longitude - lon_span)
+        max_row, max_col = self._cell(latitude + lat_span, longitude + lon_span)
+
+        matches = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                for key, point_lat, point_lon in self.cells.get((row, col), ()):
+                    distance = haversine_km(latitude, longitude, point_lat, point_lon)
+                    if distance <= radius_km:
+                        matches.append((key, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
@@ -0,0 +1,59 @@
+# Gunicorn configuration for serving the Flask API in production:
+#
+#     gunicorn -c gunicorn.conf.py
+#
+# Each worker builds its own app (and so its own connection pools) via the
+# main.create_app factory, then warms up before accepting requests. Keep
+# USERS_DB_POOL_SIZE / APP_DB_POOL_SIZE at least GUNICORN_THREADS so every
+# worker thread can hold a connection on each bind.
+#
+# Every worker may open pool_size + max_overflow connections per bind, so
+# workers x that total must fit in DB_CONNECTION_BUDGET: the share of
+# MySQL's max_connections (151 by default) left to the API after the
+# scraper, the PHP site and admin sessions. The default worker count is
+# capped to fit, and an explicit GUNICORN_WORKERS that does not fit is
+# refused at startup.
+import multiprocessing
+import os
+
+wsgi_app = 'main:create_app()'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+
+def pool_connections(prefix):
+    """Most connections one worker can hold on a bind (see main.pool_options)"""
+    return int(os.getenv(f'{prefix}_POOL_SIZE', '5')) + int(os.getenv(f'{prefix}_MAX_OVERFLOW', '5'))
+
+
+connection_budget = int(os.getenv('DB_CONNECTION_BUDGET', '100'))
+connections_per_worker = pool_connections('USERS_DB') + pool_connections('APP_DB')
+
+worker_class = 'gthread'
+if 'GUNICORN_WORKERS' in os.environ:
+    workers = int(os.environ['GUNICORN_WORKERS'])
+    if workers * connections_per_worker > connection_budget:
+        raise RuntimeError(
+            f'{workers} workers x {connections_per_worker} pooled connections exceeds '
+            f'DB_CONNECTION_BUDGET={connection_budget}; lower GUNICORN_WORKERS or the pool sizes'
+        )
+else:
+    workers = max(min(multiprocessing.cpu_count() * 2 + 1, connection_budget // connections_per_worker), 1)
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth of in-process caches
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = 1000
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    """Open pooled connections and prime caches before the worker accepts traffic"""
+    from main import warm_up
+
+    warm_up(worker.wsgi)
@@ -0,0 +1,75 @@
+# Parse the free-text age ranges spiders emit ("5–12", "3+", "Under 5",
+# "18 months - 5 years", ...) into integer bounds stored as
+# activities.min_age / activities.max_age.
+import re
+
+# Upper bound stored for open-ended ranges such as "3+"
+OPEN_MAX_AGE = 99
+
+_UNIT = r'(months?|mths?|mos?|years?|yrs?|y\.?o\.?)?'
+# Bounded so that a longer number such as "100+" does not match its last digits
+_NUMBER = r'(?<!\d)(\d{1,2}(?:\.\d+)?)(?!\d)'
+
+RANGE_RE = re.compile(_NUMBER + r'\s*' + _UNIT + r'\s*(?:-|to)\s*' + _NUMBER + r'\s*' + _UNIT)
+PLUS_RE = re.compile(
+    _NUMBER + r'\s*' + _UNIT + r'\s*(?:\+|and\s+(?:up|over|older|above)|&\s*(?:up|over)|or\s+older)'
+)
+UNDER_RE = re.compile(r'(under|below|less\s+than|up\s+to)\s*' + _NUMBER + r'\s*' + _UNIT)
+# "12 years and under" includes twelve-year-olds, unlike "Under 12"
+UNDER_SUFFIX_RE = re.compile(
+    _NUMBER + r'\s*' + _UNIT + r'\s*(?:(?:and|or)\s+|&\s*)(?:under|below|younger|less)'
+)
+SINGLE_RE = re.compile(r'^\D*' + _NUMBER + r'\s*' + _UNIT + r'\D*$')
+# School years ("Year 1-6", "Grade 3") are not ages
+SCHOOL_YEAR_RE = re.compile(r'\b(?:year|yr|grade)s?\s*\d')
+
+
+def _years(number, unit):
+    value = float(number)
+    if unit and unit.startswith('m'):
+        value /= 12
+    return int(value)
+
+
+def parse_age_range(age_range):
+    """Return (min_age, max_age) in whole years, or (None, None) if unparseable"""
+    if not age_range:
+        return None, None
+    text = age_range.lower().replace('–', '-').replace('—', '-')
+
+    if 'all ages' in text:
+        return 0, OPEN_MAX_AGE
+    if SCHOOL_YEAR_RE.search(text):
+        return None, None
+
+    match = RANGE_RE.search(text)
+    if match:
+        low, low_unit, high, high_unit = match.groups()
+        # "18 months - 5 years" vs "5-12 years": a missing unit takes the other's
+        low_age = _years(low, low_unit or high_unit)
+        high_age = _years(high, high_unit or low_unit)
+        return min(low_age, high_age), min(max(low_age, high_age), OPEN_MAX_AGE)
+
+    match = PLUS_RE.search(text)
+    if match:
+        return min(_years(*match.groups()), OPEN_MAX_AGE), OPEN_MAX_AGE
+
+    match = UNDER_SUFFIX_RE.search(text)
+    if match:
+        return 0, min(_years(*match.groups()), OPEN_MAX_AGE)
+
+    match = UNDER_RE.search(text)
+    if match:
+        bound, number, unit = match.groups()
+        max_age = _years(number, unit)
+        if not bound.startswith('up'):
+            # "Under 5" excludes five-year-olds
+            max_age = max(max_age - 1, 0)
+        return 0, max_age
+
+    match = SINGLE_RE.match(text)
+    if match:
+        age = min(_years(*match.groups()), OPEN_MAX_AGE)
+        return age, age
+
+    return None, None
@@ -0,0 +1,51 @@
+# Backfill activities.min_age / max_age from the free-text age_range column.
+#
+# Run from the Scrapy project directory (the scraper container's working dir):
+#
+#     python -m kidssmart.backfill_age_ranges          # rows not yet parsed
+#     python -m kidssmart.backfill_age_ranges --all    # re-parse every row
+import argparse
+
+from .age_ranges import parse_age_range
+from .pipelines import connect_database
+
+BATCH_SIZE = 1000
+
+
+def backfill(reparse_all=False):
+    connection = connect_database()
+    updated = 0
+    try:
+        with connection.cursor() as cursor:
+            query = """
+                SELECT activity_id, age_range FROM activities
+                WHERE age_range IS NOT NULL AND age_range != ''
+            """
+            if not reparse_all:
+                query += " AND min_age IS NULL"
+            cursor.execute(query)
+            rows = cursor.fetchall()
+
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            params = [
+                parse_age_range(row['age_range']) + (row['activity_id'],)
+                for row in batch
+            ]
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    "UPDATE activities SET min_age = %s, max_age = %s WHERE activity_id = %s",
+                    params
+                )
+            connection.commit()
+            updated += len(batch)
+    finally:
+        connection.close()
+    return updated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Backfill activities.min_age/max_age from age_range')
+    parser.add_argument('--all', action='store_true', help='re-parse rows that already have bounds')
+    args = parser.parse_args()
+    print(f"Backfilled age bounds for {backfill(reparse_all=args.all)} activities")
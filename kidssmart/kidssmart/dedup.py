@@ -0,0 +1,97 @@
+# In-process duplicate detection for MySQLActivityPipeline: hashes of every
+# stored activity's normalised title (per suburb) and source_url, loaded once
+# per crawl so each item is checked without a SELECT. Listings of one
+# provider under different titles are merged later by `flask merge-duplicates`.
+import hashlib
+import math
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalise_title(title):
+    """Case-, punctuation- and whitespace-insensitive form of a title"""
+    return _NON_WORD_RE.sub(' ', (title or '').casefold()).strip()
+
+
+def normalise_url(url):
+    """URL with lower-cased scheme and host, no fragment and no trailing slash"""
+    url = (url or '').strip()
+    if not url:
+        return ''
+    parts = urlsplit(url)
+    return urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), parts.query, ''
+    ))
+
+
+def _digest(kind, value, size):
+    return hashlib.blake2b(f'{kind}:{value}'.encode(), digest_size=size).digest()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for ``capacity`` keys at ``error_rate`` false positives"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.size = max(int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, digest):
+        for position in self._positions(digest):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class DedupIndex:
+    """Set of normalised (title, suburb) and source_url hashes.
+
+    Titles are keyed with their suburb, as distinct providers in different
+    suburbs can share a name.
+
+    The default exact mode keeps 64-bit hashes in a set. With ``bloom=True``
+    a BloomFilter sized for ``capacity`` activities is used instead, which
+    takes a few bytes per activity but can report false positives, so
+    callers should confirm a hit against the database when ``exact`` is
+    False. Misses are always definite.
+    """
+
+    def __init__(self, capacity=0, bloom=False, error_rate=0.001):
+        self.exact = not bloom
+        if bloom:
+            # Two keys per activity, with headroom for the crawl's new items
+            self._keys = BloomFilter(max(capacity, 10000) * 2 * 5 // 4, error_rate)
+        else:
+            self._keys = set()
+        self.count = 0
+
+    def _key(self, kind, value):
+        if self.exact:
+            return int.from_bytes(_digest(kind, value, 8), 'little')
+        return _digest(kind, value, 16)
+
+    def add(self, title=None, source_url=None, suburb=None):
+        title, source_url = normalise_title(title), normalise_url(source_url)
+        if title:
+            self._keys.add(self._key('title', f'{title}|{normalise_title(suburb)}'))
+        if source_url:
+            self._keys.add(self._key('url', source_url))
+        self.count += 1
+
+    def has_title(self, title, suburb=None):
+        title = normalise_title(title)
+        return bool(title) and self._key('title', f'{title}|{normalise_title(suburb)}') in self._keys
+
+    def has_url(self, source_url):
+        source_url = normalise_url(source_url)
+        return bool(source_url) and self._key('url', source_url) in self._keys
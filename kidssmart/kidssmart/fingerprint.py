@@ -0,0 +1,25 @@
+# Content fingerprints of scraped activities, stored in activities.content_hash
+# so a re-scrape can tell whether anything about an activity changed.
+import hashlib
+import re
+
+# Item fields that make up an activity's content; scrape time and the
+# spider name are deliberately left out
+FINGERPRINT_FIELDS = (
+    'title', 'description', 'category', 'suburb', 'postcode', 'address',
+    'phone', 'email', 'website', 'image_url', 'source_url', 'age_range'
+)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalise(value):
+    if value is None:
+        return ''
+    return _WHITESPACE_RE.sub(' ', str(value)).strip()
+
+
+def content_hash(item):
+    """32-character hex digest of the item's FINGERPRINT_FIELDS"""
+    content = '\x1f'.join(_normalise(item.get(field)) for field in FINGERPRINT_FIELDS)
+    return hashlib.blake2b(content.encode(), digest_size=16).hexdigest()
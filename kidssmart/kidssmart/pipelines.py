@@ -2,69 +2,287 @@
 import pymysql
 from datetime import datetime
 import os
+import time
+
+from twisted.internet import defer, threads
+from twisted.python.threadpool import ThreadPool
+
+from .age_ranges import parse_age_range
+from .dedup import DedupIndex
+from .fingerprint import content_hash
+
+
+def connect_database():
+    """Open a connection to the activities database as the scraper user"""
+    return pymysql.connect(
+        host=os.getenv('DB_HOST', 'database'),
+        user=os.getenv('SCRAPER_USER', 'scraper_user'),
+        password=os.getenv('SCRAPER_PASSWORD', 'ScraperPass123!'),
+        database='kidssmart_app',
+        charset='utf8mb4',
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+
+# Columns written for each activity, in INSERT order
+ACTIVITY_COLUMNS = (
+    'title', 'description', 'category', 'suburb', 'postcode', 'address',
+    'phone', 'email', 'website', 'image_url', 'source_url', 'source_name', 'content_hash',
+    'scraped_at', 'age_range', 'min_age', 'max_age'
+)
+SOURCE_URL = ACTIVITY_COLUMNS.index('source_url')
+CONTENT_HASH = ACTIVITY_COLUMNS.index('content_hash')
+
+# Columns refreshed when a stored activity is re-scraped with new content;
+# title and approval are kept
+UPDATED_COLUMNS = tuple(column for column in ACTIVITY_COLUMNS if column not in ('title', 'source_url'))
+
+INSERT_ACTIVITY = f"""
+    INSERT INTO activities ({', '.join(ACTIVITY_COLUMNS)})
+    VALUES ({', '.join(['%s'] * len(ACTIVITY_COLUMNS))})
+"""
+
+UPDATE_ACTIVITY = f"""
+    UPDATE activities SET {', '.join(f'{column} = %s' for column in UPDATED_COLUMNS)}
+    WHERE source_url = %s
+"""
+
+# Re-scraped source_urls refresh the existing row. ON DUPLICATE KEY fires on
+# any unique key, and databases created before
+# 11-add-activity-provenance.sql still have one on title, so each column is
+# only replaced when the conflicting row has the same source_url; a title
+# collision from another listing leaves the stored row untouched. VALUES()
+# rather than a row alias keeps the statement in the form pymysql's
+# executemany rewrites into one multi-row INSERT.
+UPSERT_ACTIVITY = INSERT_ACTIVITY + "ON DUPLICATE KEY UPDATE " + ', '.join(
+    f'{column} = IF(source_url <=> VALUES(source_url), VALUES({column}), {column})'
+    for column in UPDATED_COLUMNS
+)
+
 
 class MySQLActivityPipeline:
-    def __init__(self):
+    """Save scraped activities to kidssmart_app.activities.
+
+    With ACTIVITY_DB_BATCH_SIZE = 0 every item is written in its own
+    transaction: new activities are inserted, stored source_urls updated and
+    items reusing a stored title in the same suburb under a new source_url
+    skipped. Otherwise
+    items are buffered and upserted on source_url with a single executemany
+    per batch, flushed once ACTIVITY_DB_BATCH_SIZE items are waiting, when
+    the oldest has waited ACTIVITY_DB_BATCH_INTERVAL seconds, and when the
+    spider closes; items reusing a stored title in the same suburb under a
+    new source_url are skipped.
+
+    Duplicates are found in a DedupIndex of every stored (title, suburb) and
+    source_url, loaded in open_spider (a Bloom filter when
+    ACTIVITY_DEDUP_BLOOM is set, with hits confirmed by a SELECT). Listings
+    of one provider under different titles or from different sources are
+    left to `flask merge-duplicates`.
+
+    Each row stores a content_hash of its scraped fields. An item whose
+    source_url is already stored is only written when its hash differs, so
+    updated_at moves only when an activity actually changed. The number of
+    new, changed, unchanged and duplicate items is logged and recorded in
+    scraping_logs when the spider closes.
+
+    All database work runs on a dedicated single-thread pool that owns the
+    connection, so the reactor keeps downloading and rendering pages while
+    items are written. At most ACTIVITY_DB_MAX_PENDING writes are handed to
+    that thread at once; process_item returns a Deferred that fires when its
+    item is saved, so further items wait unfired in Scrapy's scraper slot
+    and the engine stops feeding responses when writes fall behind.
+    """
+
+    def __init__(self, batch_size=0, batch_interval=30.0, dedup_bloom=False, dedup_error_rate=0.001,
+                 max_pending=100):
         self.connection = None
         self.cursor = None
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.buffer = []
+        self.buffer_started = None
+        self.dedup_bloom = dedup_bloom
+        self.dedup_error_rate = dedup_error_rate
+        self.seen = None
+        self.stats = dict.fromkeys(('new', 'changed', 'unchanged', 'duplicate'), 0)
+        self.max_pending = max_pending
+        self.threadpool = None
+        self.pending = None
+        self.shutdown_trigger = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            batch_size=crawler.settings.getint('ACTIVITY_DB_BATCH_SIZE', 0),
+            batch_interval=crawler.settings.getfloat('ACTIVITY_DB_BATCH_INTERVAL', 30.0),
+            dedup_bloom=crawler.settings.getbool('ACTIVITY_DEDUP_BLOOM', False),
+            dedup_error_rate=crawler.settings.getfloat('ACTIVITY_DEDUP_BLOOM_ERROR_RATE', 0.001),
+            max_pending=crawler.settings.getint('ACTIVITY_DB_MAX_PENDING', 100)
+        )
 
     def open_spider(self, spider):
-        """Connect to database when spider starts"""
+        """Start the database thread, then connect and load the dedup index on it"""
+        # Imported here so loading the pipeline never installs a reactor
+        from twisted.internet import reactor
+
+        self.threadpool = ThreadPool(minthreads=1, maxthreads=1, name='activity-db')
+        self.threadpool.start()
+        # Its thread is not a daemon, so a crawl stopped before close_spider
+        # runs would otherwise keep the process alive after the reactor stops
+        self.shutdown_trigger = reactor.addSystemEventTrigger('during', 'shutdown', self.threadpool.stop)
+        self.pending = defer.DeferredSemaphore(self.max_pending)
+        return threads.deferToThreadPool(reactor, self.threadpool, self._open_database, spider)
+
+    def close_spider(self, spider):
+        """Flush buffered items and close the connection, then stop the database thread"""
+        from twisted.internet import reactor
+
+        d = threads.deferToThreadPool(reactor, self.threadpool, self._close_database, spider)
+        d.addBoth(self._stop_threadpool)
+        return d
+
+    def process_item(self, item, spider):
+        """Queue item for the database thread; the Deferred fires with it once saved"""
+        from twisted.internet import reactor
+
+        if not (self.connection and self.cursor):
+            return item
+        d = self.pending.run(threads.deferToThreadPool, reactor, self.threadpool, self._save_item, item, spider)
+        d.addCallback(lambda _: item)
+        return d
+
+    def _stop_threadpool(self, result):
+        from twisted.internet import reactor
+
+        reactor.removeSystemEventTrigger(self.shutdown_trigger)
+        self.threadpool.stop()
+        return result
+
+    def _open_database(self, spider):
         try:
-            self.connection = pymysql.connect(
-                host=os.getenv('DB_HOST', 'database'),
-                user=os.getenv('SCRAPER_USER', 'scraper_user'),
-                password=os.getenv('SCRAPER_PASSWORD', 'ScraperPass123!'),
-                database='kidssmart_app',
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor
-            )
+            self.connection = connect_database()
             self.cursor = self.connection.cursor()
             spider.logger.info("Database connection opened")
+            self.seen = self._load_dedup_index(spider)
         except Exception as e:
             spider.logger.error(f"Database connection failed: {e}")
             # Don't raise exception; just log and skip DB saving
             self.connection = None
             self.cursor = None
 
-    def close_spider(self, spider):
-        """Close database connection"""
+    def _close_database(self, spider):
+        if self.connection and self.cursor:
+            if self.buffer:
+                self._flush(spider)
+            self._log_run(spider)
         if self.cursor:
             self.cursor.close()
         if self.connection:
             self.connection.close()
         spider.logger.info("Database connection closed")
 
-    def process_item(self, item, spider):
-        """Process item and save to database if DB is available"""
-        if self.connection and self.cursor:
-            try:
+    def _save_item(self, item, spider):
+        try:
+            if self.batch_size > 0:
+                self._buffer_item(item, spider)
+            else:
                 self._save_to_db(item, spider)
-            except Exception as e:
-                spider.logger.error(f"Error saving to DB: {e}")
-        return item
+        except Exception as e:
+            spider.logger.error(f"Error saving to DB: {e}")
 
-    def _save_to_db(self, item, spider):
-        if not item.get('title'):
-            return
+    def _load_dedup_index(self, spider):
+        started = time.monotonic()
+        self.cursor.execute("SELECT COUNT(*) AS total FROM activities")
+        total = self.cursor.fetchone()['total']
+        index = DedupIndex(capacity=total, bloom=self.dedup_bloom, error_rate=self.dedup_error_rate)
 
-        # Check if the record already exists based on title
+        # Unbuffered, so the table is streamed rather than held in memory twice
+        with self.connection.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute("SELECT title, source_url, suburb FROM activities")
+            for rows in iter(lambda: cursor.fetchmany(10000), ()):
+                for title, source_url, suburb in rows:
+                    index.add(title, source_url, suburb)
+
+        spider.logger.info(
+            f"Loaded {'Bloom filter' if self.dedup_bloom else 'dedup index'} of {index.count} activities "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+        return index
+
+    def _is_duplicate(self, item):
+        """True if item's title (in its suburb) or source_url is already stored"""
+        title, source_url, suburb = item.get('title'), item.get('source_url'), item.get('suburb')
+        if not (self.seen.has_title(title, suburb) or self.seen.has_url(source_url)):
+            return False
+        if self.seen.exact:
+            return True
         self.cursor.execute(
-            "SELECT activity_id FROM activities WHERE title = %s",
-            (item.get('title'),)
+            "SELECT activity_id FROM activities WHERE (title = %s AND suburb <=> %s) OR source_url = %s LIMIT 1",
+            (title, suburb, source_url)
         )
-        result = self.cursor.fetchone()
-        if result:
-            spider.logger.info(f"Duplicate found, skipping: {item.get('title')}")
-            return
+        return self.cursor.fetchone() is not None
 
-        # Insert if not found
-        self.cursor.execute("""
-            INSERT INTO activities (
-                title, description, category, suburb, postcode, address,
-                phone, email, website, image_url, source_url, source_name, scraped_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
+    def _is_duplicate_title(self, item):
+        """True if item's title is stored in its suburb under a different source_url"""
+        title, source_url, suburb = item.get('title'), item.get('source_url'), item.get('suburb')
+        if not self.seen.has_title(title, suburb) or self.seen.has_url(source_url):
+            return False
+        if self.seen.exact:
+            return True
+        self.cursor.execute(
+            "SELECT activity_id FROM activities "
+            "WHERE title = %s AND suburb <=> %s AND NOT source_url <=> %s LIMIT 1",
+            (title, suburb, source_url)
+        )
+        return self.cursor.fetchone() is not None
+
+    def _stored_hashes(self, source_urls):
+        """{source_url: content_hash} of the given source_urls that are stored"""
+        source_urls = list(source_urls)
+        if not source_urls:
+            return {}
+        self.cursor.execute(
+            f"SELECT source_url, content_hash FROM activities "
+            f"WHERE source_url IN ({', '.join(['%s'] * len(source_urls))})",
+            source_urls
+        )
+        return {row['source_url']: row['content_hash'] for row in self.cursor.fetchall()}
+
+    def _classify(self, batch):
+        """(status, params) of each buffered row to write, and the number left unchanged"""
+        stored = self._stored_hashes({params[SOURCE_URL] for params in batch if params[SOURCE_URL]})
+        rows = []
+        for params in batch:
+            source_url = params[SOURCE_URL]
+            if source_url in stored:
+                if stored[source_url] == params[CONTENT_HASH]:
+                    continue
+                status = 'changed'
+            else:
+                status = 'new'
+            if source_url:
+                # A source_url scraped twice in one batch is compared with its first copy
+                stored[source_url] = params[CONTENT_HASH]
+            rows.append((status, params))
+        return rows, len(batch) - len(rows)
+
+    def _log_run(self, spider):
+        summary = ', '.join(f'{count} {status}' for status, count in self.stats.items())
+        spider.logger.info(f"Activities this run: {summary}")
+        try:
+            self.cursor.execute(
+                "INSERT INTO scraping_logs (scraper_name, status, message) VALUES (%s, 'completed', %s)",
+                (spider.name, f"Activities: {summary}")
+            )
+            self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+            spider.logger.error(f"Error recording scraping log: {e}")
+
+    def _activity_params(self, item, spider):
+        # Structured bounds let the API filter by age with an index range scan
+        min_age, max_age = parse_age_range(item.get('age_range'))
+        return (
             item.get('title'),
             item.get('description'),
             item.get('category'),
@@ -77,9 +295,99 @@ class MySQLActivityPipeline:
             item.get('image_url'),
             item.get('source_url'),
             spider.name,
-            datetime.now()
-        ))
+            content_hash(item),
+            datetime.now(),
+            item.get('age_range'),
+            min_age,
+            max_age
+        )
+
+    def _buffer_item(self, item, spider):
+        if not item.get('title'):
+            return
+        if self._is_duplicate_title(item):
+            spider.logger.info(f"Duplicate title found, skipping: {item.get('title')}")
+            self.stats['duplicate'] += 1
+            return
+        self.seen.add(item.get('title'), item.get('source_url'), item.get('suburb'))
+        if not self.buffer:
+            self.buffer_started = time.monotonic()
+        self.buffer.append(self._activity_params(item, spider))
+        if (
+            len(self.buffer) >= self.batch_size
+            or time.monotonic() - self.buffer_started >= self.batch_interval
+        ):
+            self._flush(spider)
+
+    def _flush(self, spider):
+        """Upsert every new or changed buffered item in one transaction"""
+        batch, self.buffer = self.buffer, []
+        started = time.monotonic()
+        try:
+            rows, unchanged = self._classify(batch)
+            if rows:
+                self.cursor.executemany(UPSERT_ACTIVITY, [params for _, params in rows])
+            self.connection.commit()
+        except Exception as e:
+            self.connection.rollback()
+            spider.logger.error(f"Batch of {len(batch)} activities failed ({e}); retrying one at a time")
+            self._save_rows(batch, spider)
+            return
+        for status, _ in rows:
+            self.stats[status] += 1
+        self.stats['unchanged'] += unchanged
+        spider.logger.info(
+            f"Saved batch of {len(rows)} activities ({unchanged} unchanged skipped) "
+            f"in {time.monotonic() - started:.2f}s"
+        )
+
+    def _save_rows(self, batch, spider):
+        for params in batch:
+            try:
+                rows, unchanged = self._classify([params])
+                for _, row in rows:
+                    self.cursor.execute(UPSERT_ACTIVITY, row)
+                self.connection.commit()
+            except Exception as e:
+                self.connection.rollback()
+                spider.logger.error(f"Error saving to DB: {e} ({params[0]})")
+                continue
+            for status, _ in rows:
+                self.stats[status] += 1
+            self.stats['unchanged'] += unchanged
+
+    def _save_to_db(self, item, spider):
+        if not item.get('title'):
+            return
+        params = self._activity_params(item, spider)
+        source_url = params[SOURCE_URL]
+
+        # A stored source_url is only rewritten when its content changed
+        if self.seen.has_url(source_url):
+            stored = self._stored_hashes([source_url])
+            if source_url in stored:
+                if stored[source_url] == params[CONTENT_HASH]:
+                    self.stats['unchanged'] += 1
+                    return
+                self.cursor.execute(UPDATE_ACTIVITY, tuple(
+                    params[ACTIVITY_COLUMNS.index(column)] for column in UPDATED_COLUMNS
+                ) + (source_url,))
+                self.connection.commit()
+                self.stats['changed'] += 1
+                spider.logger.info(f"Updated activity: {item.get('title')}")
+                return
+
+        # Check if the record already exists based on title or source_url
+        if self._is_duplicate(item):
+            spider.logger.info(f"Duplicate found, skipping: {item.get('title')}")
+            self.stats['duplicate'] += 1
+            return
+
+        # Insert if not found
+        self.cursor.execute(INSERT_ACTIVITY, params)
         self.connection.commit()
+        self.seen.add(item.get('title'), item.get('source_url'), item.get('suburb'))
+        self.stats['new'] += 1
         spider.logger.info(f"Saved activity: {item.get('title')}")
 
 
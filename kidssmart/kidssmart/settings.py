@@ -67,6 +67,19 @@ ITEM_PIPELINES = {
     "kidssmart.pipelines.MySQLActivityPipeline": 300,
 }
 
+# MySQLActivityPipeline upserts items in batches of this many (0 = one
+# INSERT and commit per item), flushing at least every INTERVAL seconds
+ACTIVITY_DB_BATCH_SIZE = 200
+ACTIVITY_DB_BATCH_INTERVAL = 60
+# Writes handed to the pipeline's database thread at once; further items
+# wait, holding back the crawl until the database catches up
+ACTIVITY_DB_MAX_PENDING = 100
+
+# Check duplicates against a Bloom filter instead of an exact hash set
+# (a few bytes per stored activity; hits are confirmed with a SELECT)
+ACTIVITY_DEDUP_BLOOM = False
+ACTIVITY_DEDUP_BLOOM_ERROR_RATE = 0.001
+
 DOWNLOAD_HANDLERS = {
     "http": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
     "https": "scrapy_playwright.handler.ScrapyPlaywrightDownloadHandler",
@@ -1,12 +1,33 @@
+import csv
+import hashlib
+import io
 import os
+import re
+import threading
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+from urllib.parse import urlencode
 from flask_sqlalchemy import SQLAlchemy
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Blueprint, Flask, abort, current_app, g, has_request_context, render_template, request, redirect, url_for, session, flash, jsonify, stream_with_context
+import click
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from werkzeug.exceptions import NotFound
+from werkzeug.http import is_resource_modified
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.dialects.mysql import match
 from db import db  # Import the shared db instance
-
-app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+from cache import TTLCache, create_cache
+from facets import FacetCube
+from geo import GeoGrid
+from metrics import COUNT_BUCKETS, ROW_BUCKETS, Registry
+from querydebug import QueryDebugError, QueryLog, explain
+from serialization import FastJSONProvider, compress, negotiate_encoding
+from singleflight import Group
+from suggest import SuggestIndex
+from neardup import Record, find_duplicates, group_matches
+from recommender import ActivityProfile, FallbackRanking, ItemSimilarity, UserProfile, parse_child_age_range, preferred_categories, recommend
 
 # Database Configuration
 DB_HOST = os.getenv('DB_HOST', 'database')
@@ -15,19 +36,158 @@ DB_PASSWORD = os.getenv('DB_PASSWORD', 'AppPass123!')
 DB_NAME_USERS = os.getenv('DB_NAME_USERS', 'kidssmart_users')
 DB_NAME_APP = os.getenv('DB_NAME_APP', 'kidssmart_app')
 
-# Primary database (users)
-app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME_USERS}'
 
-# Secondary database (app data - activities)
-app.config['SQLALCHEMY_BINDS'] = {
-    'app_data': f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME_APP}'
-}
+def pool_options(prefix):
+    """Connection pool settings for one bind, read from <prefix>_POOL_SIZE etc.
+
+    Connections are pre-pinged on checkout and recycled before MySQL's
+    wait_timeout can drop them.
+    """
+    return {
+        'pool_size': int(os.getenv(f'{prefix}_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv(f'{prefix}_MAX_OVERFLOW', '5')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': True,
+    }
+
+
+def default_config():
+    """Application config built from the environment"""
+    return {
+        # Primary database (users)
+        'SQLALCHEMY_DATABASE_URI': f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME_USERS}',
+        'SQLALCHEMY_ENGINE_OPTIONS': pool_options('USERS_DB'),
+
+        # Secondary database (app data - activities); binds do not inherit
+        # SQLALCHEMY_ENGINE_OPTIONS, so it is sized separately
+        'SQLALCHEMY_BINDS': {
+            'app_data': {
+                'url': f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME_APP}',
+                **pool_options('APP_DB'),
+            }
+        },
+
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Logging every statement is a throughput cost; opt in for debugging
+        'SQLALCHEMY_ECHO': os.getenv('SQLALCHEMY_ECHO', '0') == '1',
+
+        # Seconds a per-filter activity total is reused before being recounted
+        'ACTIVITY_COUNT_CACHE_TTL': int(os.getenv('ACTIVITY_COUNT_CACHE_TTL', '60')),
+
+        # Activity read API response cache ('memory' per process, or 'sqlite'
+        # shared by every worker on the host via ACTIVITY_CACHE_PATH, which
+        # defaults to api_cache.sqlite3 in the app's instance folder)
+        'ACTIVITY_CACHE_BACKEND': os.getenv('ACTIVITY_CACHE_BACKEND', 'memory'),
+        'ACTIVITY_CACHE_PATH': os.getenv('ACTIVITY_CACHE_PATH'),
+        'ACTIVITY_CACHE_SIZE': int(os.getenv('ACTIVITY_CACHE_SIZE', '2048')),
+        'ACTIVITY_CACHE_TTL': int(os.getenv('ACTIVITY_CACHE_TTL', '600')),
+
+        # Most activity ids a single /api/activities/batch request may ask for
+        'ACTIVITY_BATCH_LIMIT': int(os.getenv('ACTIVITY_BATCH_LIMIT', '500')),
+
+        # Activities whose live summary /api/users/<id>/favourites keeps in memory
+        'ACTIVITY_SUMMARY_CACHE_SIZE': int(os.getenv('ACTIVITY_SUMMARY_CACHE_SIZE', '2048')),
+
+        # JSON responses at least this many bytes are gzip/brotli compressed
+        # when the client accepts it
+        'COMPRESS_MIN_SIZE': int(os.getenv('COMPRESS_MIN_SIZE', '1024')),
+        'COMPRESS_GZIP_LEVEL': int(os.getenv('COMPRESS_GZIP_LEVEL', '6')),
+        'COMPRESS_BROTLI_QUALITY': int(os.getenv('COMPRESS_BROTLI_QUALITY', '5')),
+
+        # Rows fetched per round trip from the server-side cursor behind /api/activities/export
+        'ACTIVITY_EXPORT_CHUNK_SIZE': int(os.getenv('ACTIVITY_EXPORT_CHUNK_SIZE', '1000')),
+
+        # Suburb/postcode centroids for ?near= radius search
+        'LOCATIONS_CSV': os.getenv(
+            'LOCATIONS_CSV',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'data', 'locations.csv')
+        ),
+        'NEAR_DEFAULT_RADIUS_KM': float(os.getenv('NEAR_DEFAULT_RADIUS_KM', '10')),
+        'NEAR_MAX_RADIUS_KM': float(os.getenv('NEAR_MAX_RADIUS_KM', '50')),
+
+        # Seconds the dataset version is trusted before activities/rating stats are re-checked
+        'DATASET_VERSION_TTL': int(os.getenv('DATASET_VERSION_TTL', '5')),
+        # Seconds the activity count in the dataset version is trusted. COUNT(*)
+        # is an index scan on InnoDB, so deletions (the only change that does
+        # not bump updated_at) are noticed on this slower cadence.
+        'DATASET_COUNT_TTL': int(os.getenv('DATASET_COUNT_TTL', '60')),
+
+        # /api/recommendations: similar activities kept per activity, seconds
+        # between polls for new favourites/reviews, and seconds between full
+        # rebuilds (which also pick up deletions and edited reviews)
+        'RECOMMENDER_NEIGHBOURS': int(os.getenv('RECOMMENDER_NEIGHBOURS', '50')),
+        'RECOMMENDER_POLL_SECONDS': int(os.getenv('RECOMMENDER_POLL_SECONDS', '30')),
+        'RECOMMENDER_REBUILD_SECONDS': int(os.getenv('RECOMMENDER_REBUILD_SECONDS', '3600')),
+
+        # Per-request N+1 and slow statement reporting, for test and bench runs.
+        # QUERY_DEBUG_RAISE turns a repeated statement into a failed request.
+        'QUERY_DEBUG': os.getenv('QUERY_DEBUG', '0') == '1',
+        'QUERY_DEBUG_SLOW_MS': float(os.getenv('QUERY_DEBUG_SLOW_MS', '100')),
+        'QUERY_DEBUG_REPEAT_THRESHOLD': int(os.getenv('QUERY_DEBUG_REPEAT_THRESHOLD', '3')),
+        'QUERY_DEBUG_RAISE': os.getenv('QUERY_DEBUG_RAISE', '0') == '1',
+    }
+
+
+api = Blueprint('api', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    """Application factory.
+
+    ``config`` overrides the environment-derived defaults, e.g. to point
+    the binds at a different database.
+    """
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+    app.config.from_mapping(default_config())
+    if config:
+        app.config.from_mapping(config)
 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ECHO'] = True
+    # Initialize the shared db instance with the app
+    db.init_app(app)
+    init_caches(app)
+    init_compression(app)
+    init_metrics(app)
+    init_query_debug(app)
+    app.register_blueprint(api)
+    return app
+
+
+def warm_up(app):
+    """Prepare a freshly started worker before it accepts traffic.
+
+    Fills each bind's connection pool up to pool_size and primes the
+    dataset version, location index, facet cube, suggest index,
+    recommender and the first page of /api/activities.
+    """
+    with app.app_context():
+        for key, engine in db.engines.items():
+            connections = []
+            try:
+                for _ in range(engine.pool.size()):
+                    connection = engine.connect()
+                    connection.exec_driver_sql('SELECT 1')
+                    connections.append(connection)
+            except Exception as e:
+                app.logger.warning(f'Warm-up could not open connections for bind {key!r}: {e}')
+            finally:
+                for connection in connections:
+                    connection.close()
+
+        try:
+            get_dataset_version()
+            get_location_index()
+            get_facet_cube()
+            get_suggest_index()
+            get_recommendation_fallback(get_recommender(), get_recommendation_catalogue())
+        except Exception as e:
+            app.logger.warning(f'Warm-up could not prime caches: {e}')
+
+    with app.test_client() as client:
+        client.get('/api/activities')
 
-# Initialize the shared db instance with the app
-db.init_app(app)
 
 # ============================================================================
 # USER DATABASE MODELS (kidssmart_users)
@@ -124,14 +284,26 @@ class Activity(db.Model):
     email = db.Column(db.String(255))
     website = db.Column(db.String(500))
     age_range = db.Column(db.String(50))
+    min_age = db.Column(db.SmallInteger)  # Parsed from age_range by the scraper pipeline
+    max_age = db.Column(db.SmallInteger)  # 99 for open-ended ranges such as "3+"
     cost = db.Column(db.String(100))
     schedule = db.Column(db.Text)
     image_url = db.Column(db.String(500))
     source_url = db.Column(db.String(500), unique=True)
     source_name = db.Column(db.String(100))  # 'activeactivities', 'kidsbook', etc.
+    content_hash = db.Column(db.String(32))  # Fingerprint of the scraped fields, set by the pipeline
     scraped_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     is_approved = db.Column(db.Boolean, default=False)
+    # Canonical activity this listing was merged into by `flask merge-duplicates`
+    merged_into = db.Column(db.Integer, index=True)
+
+    __table_args__ = (
+        # Backs /api/activities?search= (see database/init/05-add-activity-search-index.sql)
+        db.Index('ft_activities_search', 'title', 'description', mysql_prefix='FULLTEXT'),
+        db.Index('idx_age', 'min_age', 'max_age'),
+        db.Index('idx_title_suburb', 'title', 'suburb'),
+    )
 
 
 class Category(db.Model):
@@ -151,6 +323,53 @@ class Location(db.Model):
     suburb = db.Column(db.String(100), nullable=False)
     postcode = db.Column(db.String(10), nullable=False)
     state = db.Column(db.String(50))
+    latitude = db.Column(db.Numeric(9, 6, asdecimal=False))  # Centroid, see `flask load-locations`
+    longitude = db.Column(db.Numeric(9, 6, asdecimal=False))
+
+
+# Bayesian prior for ActivityRatingStats.rating_score: a 3.5 star average
+# worth 5 reviews (mirrored in database/init/09-create-activity-rating-stats.sql)
+RATING_PRIOR_MEAN = 3.5
+RATING_PRIOR_COUNT = 5
+
+
+class ActivityRatingStats(db.Model):
+    """Approved review aggregates per activity, maintained by triggers on kidssmart_users.reviews"""
+    __bind_key__ = 'app_data'
+    __tablename__ = 'activity_rating_stats'
+
+    activity_id = db.Column(db.Integer, primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_avg = db.Column(
+        db.Numeric(4, 3, asdecimal=False),
+        db.Computed('CASE WHEN rating_count > 0 THEN rating_sum * 1.0 / rating_count END', persisted=True)
+    )
+    rating_score = db.Column(
+        db.Numeric(4, 3, asdecimal=False),
+        db.Computed(
+            # NULL once the last approved review goes, so the activity sorts
+            # with the unrated ones rather than at the prior
+            f'CASE WHEN rating_count > 0 THEN (rating_sum + {RATING_PRIOR_COUNT} * {RATING_PRIOR_MEAN}) '
+            f'/ (rating_count + {RATING_PRIOR_COUNT}) END',
+            persisted=True
+        ),
+        index=True
+    )
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+
+class ActivitySource(db.Model):
+    """Provenance of a canonical activity: one row per scraped listing merged into it"""
+    __bind_key__ = 'app_data'
+    __tablename__ = 'activity_sources'
+
+    source_activity_id = db.Column(db.Integer, primary_key=True)
+    activity_id = db.Column(db.Integer, nullable=False, index=True)
+    source_name = db.Column(db.String(100))
+    source_url = db.Column(db.String(500))
+    similarity = db.Column(db.Numeric(4, 3, asdecimal=False))  # NULL for the canonical listing itself
+    linked_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 # ✅ NEW: Add ScrapingLog model to match schema
@@ -165,11 +384,870 @@ class ScrapingLog(db.Model):
     run_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+# ============================================================================
+# SEARCH
+# ============================================================================
+
+SEARCH_TERM_RE = re.compile(r'\w+')
+
+# InnoDB does not index words shorter than innodb_ft_min_token_size (default 3)
+FULLTEXT_MIN_TERM_LENGTH = 3
+
+# InnoDB's default full-text stopword list (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD).
+# These are not indexed, so a required +for* would demand some other word
+# starting with "for"; they are dropped from the search instead. Keep in
+# step with innodb_ft_server_stopword_table if the server configures one.
+FULLTEXT_STOPWORDS = frozenset({
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for',
+    'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the',
+    'this', 'to', 'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und', 'www'
+})
+
+
+def apply_activity_search(query, search, ranked=True):
+    """Restrict an Activity query to rows matching every term in search.
+
+    On MySQL the terms run against the ft_activities_search FULLTEXT index in
+    boolean mode as required prefix matches (``+term*``) and, when ranked,
+    results are ordered by relevance, most relevant first. Terms too short for
+    the index, and non-MySQL databases, fall back to LIKE matching. On MySQL,
+    FULLTEXT_STOPWORDS are left out of the search altogether.
+    """
+    terms = [term.lower() for term in SEARCH_TERM_RE.findall(search)]
+    fulltext = db.engines['app_data'].dialect.name == 'mysql'
+    if fulltext:
+        terms = [term for term in terms if term not in FULLTEXT_STOPWORDS]
+    if not terms:
+        return query
+
+    if fulltext:
+        indexed = [term for term in terms if len(term) >= FULLTEXT_MIN_TERM_LENGTH]
+    else:
+        indexed = []
+
+    for term in terms:
+        if term not in indexed:
+            query = query.filter(
+                db.or_(
+                    Activity.title.contains(term),
+                    Activity.description.contains(term)
+                )
+            )
+
+    if indexed:
+        relevance = match(
+            Activity.title,
+            Activity.description,
+            against=' '.join(f'+{term}*' for term in indexed)
+        ).in_boolean_mode()
+        query = query.filter(relevance)
+        if ranked:
+            query = query.order_by(relevance.desc(), Activity.activity_id)
+
+    return query
+
+
+# Request arguments that change which activities match (and so their total)
+FILTER_ARGS = ('category', 'suburb', 'search', 'near', 'radius_km', 'age', 'age_min', 'age_max')
+
+# Stored max_age of open-ended ranges such as "3+"
+OPEN_MAX_AGE = 99
+
+
+def filter_activities(stmt, ranked=True, dimensions=True):
+    """Apply the approval/merge flags and the request's category/suburb/age/search/near filters.
+
+    ``age=7`` keeps activities whose age bounds include 7; ``age_min`` and
+    ``age_max`` keep those whose bounds overlap the given range. With
+    ``dimensions=False`` the category and suburb filters are left to the
+    caller (a FacetCube). Raises ValueError for a ``near`` location that
+    cannot be resolved.
+    """
+    category = request.args.get('category', '')
+    suburb = request.args.get('suburb', '')
+    search = request.args.get('search', '')
+    near = request.args.get('near', '')
+    age = request.args.get('age', type=int)
+    age_min = request.args.get('age_min', age, type=int)
+    age_max = request.args.get('age_max', age, type=int)
+
+    stmt = stmt.where(Activity.is_approved.is_(True), Activity.merged_into.is_(None))
+    if category and dimensions:
+        stmt = stmt.where(Activity.category == category)
+    if suburb and dimensions:
+        stmt = stmt.where(Activity.suburb == suburb)
+    if age_min is not None or age_max is not None:
+        # Range overlap on the idx_age (min_age, max_age) index; activities
+        # with no parsed age bounds never match
+        stmt = stmt.where(
+            Activity.min_age <= (OPEN_MAX_AGE if age_max is None else age_max),
+            Activity.max_age >= (0 if age_min is None else age_min)
+        )
+    if near:
+        radius_km = min(
+            request.args.get('radius_km', current_app.config['NEAR_DEFAULT_RADIUS_KM'], type=float),
+            current_app.config['NEAR_MAX_RADIUS_KM']
+        )
+        stmt = apply_activity_radius(stmt, near, radius_km, ranked=ranked)
+    if search:
+        stmt = apply_activity_search(stmt, search, ranked=ranked)
+    return stmt
+
+
+def filter_key():
+    """Normalised FILTER_ARGS of the current request, for caching totals"""
+    return tuple(sorted(
+        (name, value) for name, value in request.args.items(multi=True) if name in FILTER_ARGS
+    ))
+
+
+# ============================================================================
+# LOCATIONS
+# ============================================================================
+
+LocationIndex = namedtuple('LocationIndex', ['grid', 'postcodes', 'suburbs'])
+
+COORDINATES_RE = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$')
+
+
+def get_location_index():
+    """LocationIndex over every locations row that has a centroid"""
+    index = get_caches().locations.get('locations')
+    if index is None:
+        points = [
+            ((location.suburb, location.postcode), location.latitude, location.longitude)
+            for location in Location.query.filter(
+                Location.latitude.isnot(None),
+                Location.longitude.isnot(None)
+            )
+        ]
+        postcodes, suburbs = {}, {}
+        for (suburb, postcode), latitude, longitude in points:
+            postcodes.setdefault(postcode, []).append((latitude, longitude))
+            suburbs.setdefault(suburb.lower(), []).append((latitude, longitude))
+        index = LocationIndex(
+            GeoGrid(points),
+            {key: _centroid(coordinates) for key, coordinates in postcodes.items()},
+            {key: _centroid(coordinates) for key, coordinates in suburbs.items()}
+        )
+        get_caches().locations.set('locations', index)
+    return index
+
+
+def _centroid(coordinates):
+    return (
+        sum(latitude for latitude, _ in coordinates) / len(coordinates),
+        sum(longitude for _, longitude in coordinates) / len(coordinates)
+    )
+
+
+def resolve_near(near):
+    """Return (latitude, longitude) for a ``lat,lon`` pair, postcode or suburb name"""
+    coordinates = COORDINATES_RE.match(near)
+    if coordinates:
+        return float(coordinates.group(1)), float(coordinates.group(2))
+    index = get_location_index()
+    point = index.postcodes.get(near.strip()) or index.suburbs.get(near.strip().lower())
+    if point is None:
+        raise ValueError(f'Unknown location: {near}')
+    return point
+
+
+def apply_activity_radius(stmt, near, radius_km, ranked=True):
+    """Restrict stmt to activities whose postcode or suburb lies within radius_km of near.
+
+    Candidate postcodes and suburbs come from the in-memory GeoGrid, so the
+    database only sees indexed ``postcode IN (...)`` / ``suburb IN (...)``
+    lookups. A ``distance_km`` column is added and, when ranked, rows are
+    ordered nearest first.
+    """
+    latitude, longitude = resolve_near(near)
+    postcode_distances, suburb_distances = {}, {}
+    for (suburb, postcode), distance in get_location_index().grid.within(latitude, longitude, radius_km):
+        distance = round(distance, 2)
+        postcode_distances.setdefault(postcode, distance)
+        suburb_distances.setdefault(suburb, distance)
+
+    if not postcode_distances:
+        return stmt.where(db.false()).add_columns(db.null().label('distance_km'))
+
+    # Place an activity by its suburb, which is more precise than a postcode
+    # shared by several suburbs, falling back to the postcode
+    distance = db.func.coalesce(
+        db.case(suburb_distances, value=Activity.suburb),
+        db.case(postcode_distances, value=Activity.postcode)
+    )
+    stmt = stmt.where(db.or_(
+        Activity.postcode.in_(postcode_distances),
+        Activity.suburb.in_(suburb_distances)
+    )).add_columns(distance.label('distance_km'))
+    if ranked:
+        stmt = stmt.order_by(distance, Activity.activity_id)
+    return stmt
+
+
+@api.cli.command('load-locations')
+@click.argument('path', required=False)
+def load_locations_command(path):
+    """Load suburb/postcode centroids into the locations table.
+
+    PATH is a CSV with suburb, postcode, state, latitude and longitude
+    columns; defaults to LOCATIONS_CSV.
+    """
+    path = path or current_app.config['LOCATIONS_CSV']
+    existing = {(location.suburb, location.postcode): location for location in Location.query}
+    loaded = 0
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            key = (row['suburb'].strip(), row['postcode'].strip())
+            location = existing.get(key)
+            if location is None:
+                location = Location(suburb=key[0], postcode=key[1])
+                db.session.add(location)
+                existing[key] = location
+            location.state = row.get('state') or location.state
+            location.latitude = float(row['latitude'])
+            location.longitude = float(row['longitude'])
+            loaded += 1
+    db.session.commit()
+    get_caches().locations.clear()
+    click.echo(f'Loaded {loaded} locations from {path}')
+
+
+# ============================================================================
+# RATINGS
+# ============================================================================
+
+@api.cli.command('rebuild-rating-stats')
+def rebuild_rating_stats_command():
+    """Recompute activity_rating_stats from approved reviews.
+
+    The table is normally kept current by triggers on kidssmart_users.reviews
+    (database/init/09-create-activity-rating-stats.sql); this repairs drift
+    and fills it on databases without the triggers.
+    """
+    totals = db.session.execute(
+        db.select(UserReview.activity_id, db.func.count(), db.func.sum(UserReview.rating))
+        .where(UserReview.is_approved.is_(True))
+        .group_by(UserReview.activity_id)
+    ).all()
+    db.session.execute(db.delete(ActivityRatingStats))
+    if totals:
+        db.session.execute(db.insert(ActivityRatingStats), [
+            {'activity_id': activity_id, 'rating_count': count, 'rating_sum': total}
+            for activity_id, count, total in totals
+        ])
+    db.session.commit()
+    click.echo(f'Rebuilt rating stats for {len(totals)} activities')
+
+
+# ============================================================================
+# DEDUPLICATION
+# ============================================================================
+
+def canonical_order(row):
+    """Sort key putting the listing to keep first: approved, longest description, oldest"""
+    return (not row.is_approved, -len(row.description or ''), row.activity_id)
+
+
+@api.cli.command('merge-duplicates')
+@click.option('--threshold', default=0.7, show_default=True, help='Minimum similarity score to merge')
+@click.option('--dry-run', is_flag=True, help='Print the groups that would be merged without changing anything')
+def merge_duplicates_command(threshold, dry_run):
+    """Merge listings of the same activity from different sources.
+
+    Unmerged activities are compared within their postcode (or suburb) by
+    MinHash/LSH over name and description shingles (see neardup.py). Each
+    group of matches keeps one canonical activity; the others get
+    merged_into set and drop out of the API, and activity_sources records
+    every listing under the activity it now belongs to. Listings merged by
+    earlier runs follow their canonical activity if it is merged in turn.
+    """
+    rows = {
+        row.activity_id: row
+        for row in db.session.execute(
+            db.select(
+                Activity.activity_id, Activity.title, Activity.description, Activity.suburb,
+                Activity.postcode, Activity.is_approved
+            ).where(Activity.merged_into.is_(None))
+        )
+    }
+    started = time.monotonic()
+    matches = find_duplicates(
+        (Record(row.activity_id, row.title, row.description, row.suburb, row.postcode) for row in rows.values()),
+        threshold=threshold
+    )
+    groups = group_matches(matches)
+    click.echo(
+        f'Compared {len(rows)} activities in {time.monotonic() - started:.1f}s: '
+        f'{len(matches)} matches in {len(groups)} groups'
+    )
+
+    best = {}
+    for left, right, score in matches:
+        best[left] = max(score, best.get(left, 0))
+        best[right] = max(score, best.get(right, 0))
+
+    merges = []
+    for group in groups:
+        canonical, *duplicates = sorted((rows[activity_id] for activity_id in group), key=canonical_order)
+        merges.extend((row.activity_id, canonical.activity_id) for row in duplicates)
+        if dry_run:
+            click.echo(f'{canonical.activity_id} {canonical.title!r} ({canonical.postcode or canonical.suburb})')
+            for row in duplicates:
+                click.echo(f'  <- {row.activity_id} {row.title!r} ({best[row.activity_id]:.3f})')
+    if dry_run:
+        return
+
+    # Listings scraped since the last run get their own provenance row first
+    db.session.execute(
+        db.insert(ActivitySource).from_select(
+            ['source_activity_id', 'activity_id', 'source_name', 'source_url'],
+            db.select(
+                Activity.activity_id, db.func.coalesce(Activity.merged_into, Activity.activity_id),
+                Activity.source_name, Activity.source_url
+            ).where(~Activity.activity_id.in_(db.select(ActivitySource.source_activity_id)))
+        )
+    )
+    for duplicate_id, canonical_id in merges:
+        db.session.execute(
+            db.update(Activity)
+            .where(db.or_(Activity.activity_id == duplicate_id, Activity.merged_into == duplicate_id))
+            .values(merged_into=canonical_id)
+        )
+        db.session.execute(
+            db.update(ActivitySource)
+            .where(ActivitySource.activity_id == duplicate_id)
+            .values(activity_id=canonical_id)
+        )
+        db.session.execute(
+            db.update(ActivitySource)
+            .where(ActivitySource.source_activity_id == duplicate_id)
+            .values(similarity=best[duplicate_id])
+        )
+    db.session.commit()
+    click.echo(f'Merged {len(merges)} activities into {len(groups)} canonical activities')
+
+
+# ============================================================================
+# FIELD SELECTION
+# ============================================================================
+
+# Columns a client may ask for with ?fields=
+ACTIVITY_FIELDS = (
+    'activity_id', 'title', 'description', 'category', 'suburb', 'postcode',
+    'address', 'phone', 'email', 'website', 'age_range', 'min_age', 'max_age',
+    'cost', 'schedule', 'image_url', 'source_name', 'scraped_at',
+    'rating_count', 'rating_avg', 'rating_score'
+)
+
+# ACTIVITY_FIELDS served from activity_rating_stats rather than activities
+RATING_FIELDS = ('rating_count', 'rating_avg', 'rating_score')
+
+SORT_OPTIONS = ('rating',)
+
+# Shape of each /api/activities row when no fields are requested
+DEFAULT_LIST_FIELDS = (
+    'activity_id', 'title', 'description', 'category', 'suburb', 'postcode',
+    'image_url', 'age_range', 'cost'
+)
+
+
+def parse_fields_arg(default):
+    """Return the column names requested by ?fields=, always led by activity_id.
+
+    Raises ValueError for names outside ACTIVITY_FIELDS.
+    """
+    value = request.args.get('fields', '')
+    if not value:
+        return default
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in ACTIVITY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(['activity_id'] + fields))
+
+
+def select_activity_fields(fields, ratings=False):
+    """Core SELECT of just the named Activity columns.
+
+    Rating fields, or ``ratings=True`` for sorting on them, LEFT JOIN
+    activity_rating_stats; unrated activities get a rating_count of 0.
+    """
+    columns = []
+    for name in fields:
+        if name == 'rating_count':
+            columns.append(db.func.coalesce(ActivityRatingStats.rating_count, 0).label(name))
+        elif name in RATING_FIELDS:
+            columns.append(getattr(ActivityRatingStats, name))
+        else:
+            columns.append(getattr(Activity, name))
+    stmt = db.select(*columns).select_from(Activity)
+    if ratings or any(name in RATING_FIELDS for name in fields):
+        stmt = stmt.outerjoin(
+            ActivityRatingStats, ActivityRatingStats.activity_id == Activity.activity_id
+        )
+    return stmt
+
+
+def parse_sort_arg():
+    """Return the ?sort= option, or None for the default order.
+
+    Raises ValueError for values outside SORT_OPTIONS.
+    """
+    sort = request.args.get('sort') or None
+    if sort is not None and sort not in SORT_OPTIONS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_OPTIONS)}")
+    return sort
+
+
+def order_by_rating(stmt):
+    """Best rating_score first, unrated activities last"""
+    return stmt.order_by(None).order_by(
+        ActivityRatingStats.rating_score.is_(None),
+        ActivityRatingStats.rating_score.desc(),
+        ActivityRatingStats.rating_count.desc(),
+        Activity.activity_id
+    )
+
+
+def row_to_dict(row):
+    """Dict for a Core result row mapping with datetimes as ISO 8601 strings.
+
+    JSON responses pass rows straight to the JSON provider, which writes
+    datetimes the same way; this is for writers that cannot, such as CSV.
+    """
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in row.items()
+    }
+
+
+# ============================================================================
+# CACHING
+# ============================================================================
+
+# changed_at is when this process first saw the tag. Row timestamps cannot
+# stand in for it: MAX(updated_at) does not move when an activity is deleted.
+DatasetVersion = namedtuple('DatasetVersion', ['tag', 'changed_at'])
+
+def init_caches(app):
+    """Attach the read API's caches to app; see get_caches()"""
+    cache_path = app.config['ACTIVITY_CACHE_PATH']
+    if app.config['ACTIVITY_CACHE_BACKEND'] == 'sqlite' and not cache_path:
+        # Owned by the app rather than a world-writable directory such as /tmp
+        os.makedirs(app.instance_path, mode=0o700, exist_ok=True)
+        cache_path = os.path.join(app.instance_path, 'api_cache.sqlite3')
+
+    app.extensions['activity_caches'] = SimpleNamespace(
+        # Concurrent identical misses share one query (see coalesce())
+        flights=Group(),
+        dataset_versions=TTLCache(maxsize=1, ttl=app.config['DATASET_VERSION_TTL']),
+        dataset_counts=TTLCache(maxsize=1, ttl=app.config['DATASET_COUNT_TTL']),
+        latest_dataset_version=None,
+        counts=TTLCache(maxsize=4096, ttl=app.config['ACTIVITY_COUNT_CACHE_TTL']),
+        responses=create_cache(
+            app.config['ACTIVITY_CACHE_BACKEND'],
+            path=cache_path,
+            maxsize=app.config['ACTIVITY_CACHE_SIZE'],
+            ttl=app.config['ACTIVITY_CACHE_TTL']
+        ),
+        facet_cubes=TTLCache(maxsize=1, ttl=app.config['ACTIVITY_CACHE_TTL']),
+        locations=TTLCache(maxsize=1, ttl=app.config['ACTIVITY_CACHE_TTL']),
+        activity_summaries=TTLCache(
+            maxsize=app.config['ACTIVITY_SUMMARY_CACHE_SIZE'], ttl=app.config['ACTIVITY_CACHE_TTL']
+        ),
+        recommendation_catalogues=TTLCache(maxsize=1, ttl=app.config['ACTIVITY_CACHE_TTL']),
+        suggest=SimpleNamespace(index=None, tag=None, building=False, lock=threading.Lock()),
+        recommender=SimpleNamespace(
+            similarity=None, favourite_mark=0, review_mark=0, built_at=0.0, polled_at=0.0,
+            building=False, fallback=None, lock=threading.Lock()
+        ),
+    )
+
+
+def get_caches():
+    return current_app.extensions['activity_caches']
+
+
+def get_dataset_version():
+    """Return the current DatasetVersion of the activity catalogue.
+
+    The tag changes whenever an activity is inserted, updated (including
+    approval changes, which bump updated_at) or deleted, and whenever a
+    review changes an activity's rating stats. Crawls that write nothing
+    leave it alone. It is re-read at most every DATASET_VERSION_TTL seconds;
+    the activity count that catches deletions every DATASET_COUNT_TTL.
+    """
+    version = get_caches().dataset_versions.get('activities')
+    if version is None:
+        version = coalesce('dataset-version', 'dataset-version', _load_dataset_version)
+    return version
+
+
+def _load_dataset_version():
+    updated_at = db.session.query(db.func.max(Activity.updated_at)).scalar()
+    activity_count = get_caches().dataset_counts.get('activities')
+    if activity_count is None:
+        activity_count = db.session.query(db.func.count(Activity.activity_id)).scalar()
+        get_caches().dataset_counts.set('activities', activity_count)
+    ratings_updated_at = db.session.query(db.func.max(ActivityRatingStats.updated_at)).scalar()
+    stamp = updated_at.isoformat() if updated_at else ''
+    ratings_stamp = ratings_updated_at.isoformat() if ratings_updated_at else ''
+    tag = f'{stamp}:{activity_count}:{ratings_stamp}'
+    version = get_caches().latest_dataset_version
+    if version is None or version.tag != tag:
+        # HTTP dates have one second resolution; a change within the second
+        # the previous tag was seen still has to move Last-Modified
+        changed_at = datetime.utcnow().replace(microsecond=0)
+        if version is not None and changed_at <= version.changed_at:
+            changed_at = version.changed_at + timedelta(seconds=1)
+        version = DatasetVersion(tag, changed_at)
+        get_caches().latest_dataset_version = version
+    get_caches().dataset_versions.set('activities', version)
+    return version
+
+
+def cached_json_response(namespace, build):
+    """Serve build()'s JSON payload from the response cache as a conditional response.
+
+    Entries are keyed on the request path, its query arguments and the
+    dataset version, so they are dropped as soon as the catalogue changes
+    rather than waiting out ACTIVITY_CACHE_TTL. The same key yields a strong
+    ETag, and the time the dataset version last changed is sent as
+    Last-Modified, so If-None-Match / If-Modified-Since revalidations are
+    answered with a 304 before any cache lookup or query for the payload.
+    Concurrent misses for
+    the same key build the payload once and share the serialised body.
+
+    Bodies of COMPRESS_MIN_SIZE bytes or more are sent gzip or brotli
+    encoded when the client accepts it; each encoded variant is cached next
+    to the plain body and carries its own ETag.
+    """
+    version = get_dataset_version()
+    args = urlencode(sorted(request.args.items(multi=True)))
+    key = f'{namespace}:{version.tag}:{request.path}?{args}'
+    encoding = negotiate_encoding(request.accept_encodings)
+    etag = hashlib.sha1(key.encode()).hexdigest() + (f'-{encoding}' if encoding else '')
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=version.changed_at):
+        response = current_app.response_class(status=304)
+    else:
+        body = get_caches().responses.get(key)
+        if body is None:
+            def build_body():
+                body = current_app.json.dumps(build()).encode()
+                get_caches().responses.set(key, body)
+                return body
+            body = coalesce(namespace, key, build_body)
+        response = current_app.response_class(body, mimetype='application/json')
+        if encoding and len(body) >= current_app.config['COMPRESS_MIN_SIZE']:
+            variant_key = f'{key}|{encoding}'
+            encoded = get_caches().responses.get(variant_key)
+            if encoded is None:
+                encoded = compress_body(body, encoding)
+                get_caches().responses.set(variant_key, encoded)
+            response.set_data(encoded)
+            response.content_encoding = encoding
+
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.last_modified = version.changed_at
+    # Let clients keep the body but revalidate it on every use
+    response.cache_control.no_cache = True
+    return response
+
+
+def cached_count(stmt, key):
+    """Return the row count of stmt, reusing a recent total for the same filter key"""
+    key = (get_dataset_version().tag,) + key
+    total = get_caches().counts.get(key)
+    if total is None:
+        def count():
+            total = db.session.execute(
+                db.select(db.func.count()).select_from(stmt.order_by(None).subquery())
+            ).scalar()
+            get_caches().counts.set(key, total)
+            return total
+        total = coalesce('count', ('count',) + key, count)
+    return total
+
+
+def coalesce(namespace, key, fn):
+    """Run fn() once for all concurrent callers with the same key (single-flight).
+
+    Callers that arrive while it runs wait for its result instead of
+    repeating the query; they are counted in kidssmart_coalesced_total.
+    Coalescing is per worker process.
+    """
+    result, shared = get_caches().flights.do(key, fn)
+    if shared:
+        current_app.extensions['metrics'].coalesced.inc(namespace=namespace)
+    return result
+
+
+def parse_bool_arg(name, default=False):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# ============================================================================
+# COMPRESSION
+# ============================================================================
+
+def init_compression(app):
+    """Compress JSON responses not served by cached_json_response.
+
+    Uncached JSON bodies of COMPRESS_MIN_SIZE bytes or more are encoded
+    per request with the best encoding the client accepts; streamed
+    responses (exports) are left alone.
+    """
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.status_code != 200
+            or response.mimetype != 'application/json'
+            or response.content_encoding
+            or response.direct_passthrough
+            or response.is_streamed
+        ):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(request.accept_encodings)
+        body = response.get_data()
+        if encoding and len(body) >= app.config['COMPRESS_MIN_SIZE']:
+            response.set_data(compress_body(body, encoding))
+            response.content_encoding = encoding
+        return response
+
+
+def compress_body(body, encoding):
+    return compress(
+        body, encoding,
+        gzip_level=current_app.config['COMPRESS_GZIP_LEVEL'],
+        brotli_quality=current_app.config['COMPRESS_BROTLI_QUALITY']
+    )
+
+
+# ============================================================================
+# METRICS
+# ============================================================================
+
+def init_metrics(app):
+    """Record per-route latency and per-request SQL usage on both binds.
+
+    SQL statements, time and returned rows are captured with engine events,
+    attributed to the route being served, and exposed together with
+    connection pool gauges at /api/metrics.
+    """
+    registry = Registry()
+    metrics = SimpleNamespace(
+        registry=registry,
+        requests=registry.counter(
+            'kidssmart_http_requests_total', 'HTTP requests handled',
+            ('route', 'method', 'status')
+        ),
+        latency=registry.histogram(
+            'kidssmart_http_request_duration_seconds', 'HTTP request latency',
+            ('route', 'method')
+        ),
+        request_statements=registry.histogram(
+            'kidssmart_sql_statements_per_request', 'SQL statements executed per request',
+            ('route',), COUNT_BUCKETS
+        ),
+        request_sql_time=registry.histogram(
+            'kidssmart_sql_duration_per_request_seconds', 'Time spent in SQL per request',
+            ('route',)
+        ),
+        request_rows=registry.histogram(
+            'kidssmart_sql_rows_per_request', 'Rows returned by SQL per request',
+            ('route',), ROW_BUCKETS
+        ),
+        statements=registry.counter(
+            'kidssmart_sql_statements_total', 'SQL statements executed', ('route', 'bind')
+        ),
+        sql_time=registry.counter(
+            'kidssmart_sql_duration_seconds_total', 'Time spent executing SQL', ('route', 'bind')
+        ),
+        rows=registry.counter(
+            'kidssmart_sql_rows_total', 'Rows returned by SQL statements', ('route', 'bind')
+        ),
+        coalesced=registry.counter(
+            'kidssmart_coalesced_total', 'Callers served by a concurrent identical query',
+            ('namespace',)
+        ),
+    )
+
+    with app.app_context():
+        engines = {key or 'users': engine for key, engine in db.engines.items()}
+
+    def pool_gauge(method):
+        def collect():
+            for bind, engine in engines.items():
+                if hasattr(engine.pool, method):
+                    yield {'bind': bind}, getattr(engine.pool, method)()
+        return collect
+
+    registry.gauge('kidssmart_db_pool_size', 'Configured connection pool size', pool_gauge('size'))
+    registry.gauge('kidssmart_db_pool_checked_out', 'Connections currently checked out', pool_gauge('checkedout'))
+    registry.gauge('kidssmart_db_pool_checked_in', 'Idle connections in the pool', pool_gauge('checkedin'))
+    registry.gauge('kidssmart_db_pool_overflow', 'Connections open beyond pool_size', pool_gauge('overflow'))
+
+    for bind, engine in engines.items():
+        _listen_for_sql(engine, bind, metrics)
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_started = time.perf_counter()
+        g.sql_stats = SimpleNamespace(statements=0, seconds=0.0, rows=0)
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'request_started' in g:
+            route = current_route()
+            metrics.requests.inc(route=route, method=request.method, status=response.status_code)
+            metrics.latency.observe(time.perf_counter() - g.request_started, route=route, method=request.method)
+            metrics.request_statements.observe(g.sql_stats.statements, route=route)
+            metrics.request_sql_time.observe(g.sql_stats.seconds, route=route)
+            metrics.request_rows.observe(g.sql_stats.rows, route=route)
+        return response
+
+    app.extensions['metrics'] = metrics
+
+
+def _listen_for_sql(engine, bind, metrics):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        rows = cursor.rowcount
+        # -1 when the driver does not know (SQLite SELECTs); pymysql's
+        # unbuffered server-side cursors report 2**64 - 1
+        if not 0 <= rows < 2 ** 32:
+            rows = 0
+        route = current_route()
+        metrics.statements.inc(route=route, bind=bind)
+        metrics.sql_time.inc(elapsed, route=route, bind=bind)
+        metrics.rows.inc(rows, route=route, bind=bind)
+        if has_request_context() and 'sql_stats' in g:
+            g.sql_stats.statements += 1
+            g.sql_stats.seconds += elapsed
+            g.sql_stats.rows += rows
+
+
+def current_route():
+    """Route rule of the request being served, used as a metrics label"""
+    if not has_request_context():
+        return '-'
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+# ============================================================================
+# QUERY DEBUG
+# ============================================================================
+
+def init_query_debug(app):
+    """Report N+1 patterns and slow statements per request when QUERY_DEBUG is set.
+
+    Every statement on both binds is logged against the request serving it.
+    After the response is built, SQL text repeated QUERY_DEBUG_REPEAT_THRESHOLD
+    times or more is logged as a warning together with the models it touched
+    and any lazy relationship loads (``User.favourites`` and friends) behind
+    it, and each statement slower than QUERY_DEBUG_SLOW_MS is logged with its
+    EXPLAIN output. Responses carry ``X-Query-Count`` and ``X-Query-Time-Ms``.
+    """
+    if not app.config['QUERY_DEBUG']:
+        return
+
+    models = {
+        model.__tablename__: model.__name__
+        for model in (User, UserFavorite, UserReview, UserSession, Activity)
+    }
+
+    with app.app_context():
+        engines = {key or 'users': engine for key, engine in db.engines.items()}
+
+    for bind, engine in engines.items():
+        _listen_for_query_debug(engine, bind)
+
+    @app.before_request
+    def start_query_log():
+        g.query_log = QueryLog(models)
+
+    @app.after_request
+    def report_query_log(response):
+        log = g.pop('query_log', None)
+        if log is None:
+            return response
+
+        route = current_route()
+        response.headers['X-Query-Count'] = str(len(log.statements))
+        response.headers['X-Query-Time-Ms'] = f'{log.seconds * 1000:.1f}'
+
+        repeats = log.repeated(app.config['QUERY_DEBUG_REPEAT_THRESHOLD'])
+        for repeat in repeats:
+            app.logger.warning(
+                f"Possible N+1 on {request.method} {route}: statement ran {repeat['count']} times "
+                f"({repeat['duplicates']} with identical parameters) on {', '.join(repeat['models'])} "
+                f"[{repeat['bind']}]: {repeat['statement']}"
+            )
+        if repeats and log.lazy_loads:
+            loads = ', '.join(f'{name} x{count}' for name, count in log.lazy_loads.most_common())
+            app.logger.warning(f'Lazy relationship loads on {request.method} {route}: {loads}')
+
+        for bind, statement, parameters, elapsed in log.slow(app.config['QUERY_DEBUG_SLOW_MS'] / 1000):
+            try:
+                plan = explain(engines[bind], statement, parameters)
+            except Exception as e:
+                plan = f'EXPLAIN failed: {e}'
+            app.logger.warning(
+                f'Slow statement on {request.method} {route} took {elapsed * 1000:.1f}ms '
+                f'[{bind}]: {statement} {parameters!r}\nEXPLAIN: {plan}'
+            )
+
+        if repeats and app.config['QUERY_DEBUG_RAISE']:
+            raise QueryDebugError(
+                f"{request.method} {route} repeated {len(repeats)} statement(s): "
+                + '; '.join(f"{repeat['count']}x {repeat['statement']}" for repeat in repeats)
+            )
+        return response
+
+
+def _listen_for_query_debug(engine, bind):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_debug_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_debug_started'].pop()
+        if has_request_context() and 'query_log' in g:
+            g.query_log.record(bind, statement, parameters, elapsed)
+
+
+# db.session is shared by every app built by create_app(), so this is
+# registered once here; requests of apps without QUERY_DEBUG have no query_log
+@event.listens_for(db.session, 'do_orm_execute')
+def record_lazy_load(orm_execute_state):
+    if (
+        orm_execute_state.is_relationship_load
+        and orm_execute_state.lazy_loaded_from is not None
+        and has_request_context() and 'query_log' in g
+    ):
+        relationship = orm_execute_state.loader_strategy_path.path[-1]
+        g.query_log.record_lazy_load(f'{relationship.parent.class_.__name__}.{relationship.key}')
+
+
 # ============================================================================
 # API ROUTES
 # ============================================================================
 
-@app.route('/api/status')
+@api.route('/api/status')
 def api_status():
     """API endpoint to check Flask app status"""
     return jsonify({
@@ -179,83 +1257,699 @@ def api_status():
     })
 
 
-@app.route('/api/activities')
+@api.route('/api/metrics')
+def api_metrics():
+    """API endpoint exposing request and SQL metrics in Prometheus text format"""
+    registry = current_app.extensions['metrics'].registry
+    return current_app.response_class(registry.render(), content_type=registry.CONTENT_TYPE)
+
+
+@api.route('/api/activities')
 def api_activities():
-    """API endpoint for activities - used by PHP frontend"""
+    """API endpoint for activities - used by PHP frontend
+
+    Pages are addressed either by ``page`` (OFFSET) or, for infinite scroll
+    and exports, by ``after=<activity_id>``, which seeks past the last id
+    seen and returns ``next_after`` for the following page. Totals come from
+    a short-lived per-filter cache; cursor pages only include one when
+    ``include_total=1`` is passed.
+
+    Rows carry DEFAULT_LIST_FIELDS unless ``fields=title,category,...``
+    narrows or widens them; only the requested columns are selected.
+    ``rating_count``, ``rating_avg`` and ``rating_score`` come from the
+    maintained activity_rating_stats table, as does the order for
+    ``sort=rating`` (page mode only).
+    """
+    try:
+        fields = parse_fields_arg(DEFAULT_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        return cached_json_response('activities', lambda: build_activities_page(fields))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def build_activities_page(fields):
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = request.args.get('limit', 12, type=int)
+    if limit < 1:
+        limit = 12
+    after = request.args.get('after', type=int)
+    include_total = parse_bool_arg('include_total', default=after is None)
+    sort = parse_sort_arg()
+    if sort is not None and after is not None:
+        raise ValueError('sort cannot be combined with after')
+    
+    # Cursor pages walk in activity_id order, so skip relevance ranking
+    stmt = filter_activities(
+        select_activity_fields(fields, ratings=sort == 'rating'), ranked=after is None
+    )
+    if sort == 'rating':
+        stmt = order_by_rating(stmt)
+    
+    total = None
+    if include_total:
+        total = cached_count(stmt, ('activities',) + filter_key())
+    
+    if after is not None:
+        stmt = stmt.where(Activity.activity_id > after).order_by(
+            Activity.activity_id
+        ).limit(limit + 1)
+    else:
+        stmt = stmt.limit(limit).offset((page - 1) * limit)
+    
+    activities = [dict(row) for row in db.session.execute(stmt).mappings()]
+    
+    result = {
+        'activities': activities,
+        'limit': limit
+    }
+    if total is not None:
+        result['total'] = total
+    if after is not None:
+        result['after'] = after
+        result['next_after'] = None
+        if len(activities) > limit:
+            del activities[limit:]
+            result['next_after'] = activities[-1]['activity_id']
+    else:
+        result['page'] = page
+    
+    return result
+
+
+@api.route('/api/activity/<int:activity_id>')
+def api_activity_detail(activity_id):
+    """API endpoint for single activity details"""
+    try:
+        return cached_json_response(
+            'activity',
+            lambda: build_activity_detail(activity_id)
+        )
+    except NotFound:
+        # Unknown, unapproved and merged-into-unapproved ids alike
+        return jsonify({'error': 'Activity not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def build_activity_detail(activity_id):
+    activity = db.get_or_404(Activity, activity_id)
+    if activity.merged_into:
+        # Listings merged into another activity resolve to the canonical one
+        activity = db.get_or_404(Activity, activity.merged_into)
+    if not activity.is_approved:
+        abort(404)
+
+    detail = activity_detail(activity)
+    detail['sources'] = [
+        {'source_name': source_name, 'source_url': source_url}
+        for source_name, source_url in db.session.execute(
+            db.select(ActivitySource.source_name, ActivitySource.source_url)
+            .where(ActivitySource.activity_id == activity.activity_id)
+            .order_by(ActivitySource.source_activity_id)
+        )
+    ] or [{'source_name': activity.source_name, 'source_url': activity.source_url}]
+    return detail
+
+
+def activity_detail(activity):
+    """Full JSON representation of an Activity"""
+    return {
+        'activity_id': activity.activity_id,
+        'title': activity.title,
+        'description': activity.description,
+        'category': activity.category,
+        'suburb': activity.suburb,
+        'postcode': activity.postcode,
+        'address': activity.address,
+        'phone': activity.phone,
+        'email': activity.email,
+        'website': activity.website,
+        'age_range': activity.age_range,
+        'cost': activity.cost,
+        'schedule': activity.schedule,
+        'image_url': activity.image_url,
+        'source_name': activity.source_name,
+        'scraped_at': activity.scraped_at.isoformat() if activity.scraped_at else None
+    }
+
+
+@api.route('/api/activities/batch', methods=['GET', 'POST'])
+def api_activities_batch():
+    """API endpoint for fetching many activities in one round trip
+
+    GET takes ``ids=1,2,3`` (or repeated ``ids``); POST takes a JSON body
+    ``{"ids": [1, 2, 3]}`` for lists too long for a URL. Activities come back
+    in the requested order, with unknown or unapproved ids listed under
+    ``missing``. Ids merged into another activity return the canonical
+    activity (once, however many of its duplicates are asked for) and are
+    listed under ``merged``.
+    """
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 12, type=int)
-        category = request.args.get('category', '')
-        suburb = request.args.get('suburb', '')
-        search = request.args.get('search', '')
+        if request.method == 'POST':
+            payload = request.get_json(silent=True) or {}
+            ids = payload.get('ids', [])
+            # int() would quietly turn 1.7 and true into 1
+            if not isinstance(ids, list) or not all(
+                isinstance(activity_id, int) and not isinstance(activity_id, bool) for activity_id in ids
+            ):
+                return jsonify({'error': 'ids must be a list of integers'}), 400
+        else:
+            ids = [part for value in request.args.getlist('ids') for part in value.split(',')]
         
-        query = Activity.query.filter_by(is_approved=True)
+        try:
+            ids = list(dict.fromkeys(int(activity_id) for activity_id in ids if str(activity_id).strip()))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'ids must be a list of integers'}), 400
         
-        if category:
-            query = query.filter_by(category=category)
-        if suburb:
-            query = query.filter_by(suburb=suburb)
-        if search:
-            query = query.filter(
-                db.or_(
-                    Activity.title.contains(search),
-                    Activity.description.contains(search)
-                )
-            )
+        if len(ids) > current_app.config['ACTIVITY_BATCH_LIMIT']:
+            return jsonify({
+                'error': f"At most {current_app.config['ACTIVITY_BATCH_LIMIT']} ids may be requested at once"
+            }), 400
         
-        total = query.count()
-        activities = query.paginate(
-            page=page, 
-            per_page=limit, 
-            error_out=False
-        ).items
+        if request.method == 'POST':
+            return jsonify(build_activity_batch(ids))
+        return cached_json_response('activities-batch', lambda: build_activity_batch(ids))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def build_activity_batch(ids):
+    merged = get_canonical_ids(ids)
+    targets = [merged.get(activity_id, activity_id) for activity_id in ids]
+    found = {}
+    if ids:
+        found = {
+            activity.activity_id: activity
+            for activity in Activity.query.filter(
+                Activity.activity_id.in_(set(targets)),
+                Activity.is_approved.is_(True),
+                Activity.merged_into.is_(None)
+            )
+        }
+    
+    return {
+        'activities': [activity_detail(found[target]) for target in dict.fromkeys(targets) if target in found],
+        'merged': [
+            {'activity_id': activity_id, 'merged_into': merged[activity_id]}
+            for activity_id in ids if merged.get(activity_id) in found
+        ],
+        'missing': [activity_id for activity_id, target in zip(ids, targets) if target not in found]
+    }
+
+
+def get_canonical_ids(ids):
+    """{activity_id: merged_into} for the ids merged into another activity"""
+    if not ids:
+        return {}
+    return dict(db.session.execute(
+        db.select(Activity.activity_id, Activity.merged_into).where(
+            Activity.activity_id.in_(ids),
+            Activity.merged_into.is_not(None)
+        )
+    ).all())
+
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'activities.ndjson'),
+    'csv': ('text/csv', 'activities.csv'),
+}
+
+
+@api.route('/api/activities/export')
+def api_activities_export():
+    """API endpoint for bulk export of approved activities
+
+    Streams every activity matching the usual filters as ``format=ndjson``
+    (default) or ``format=csv``, in activity_id order. Rows are read through
+    a server-side cursor and written in chunks, so memory use does not grow
+    with the size of the export. ``fields=`` narrows the columns as on
+    /api/activities; by default every ACTIVITY_FIELDS column is exported.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    try:
+        fields = parse_fields_arg(ACTIVITY_FIELDS)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    chunk_size = current_app.config['ACTIVITY_EXPORT_CHUNK_SIZE']
+    try:
+        stmt = filter_activities(select_activity_fields(fields), ranked=False)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    stmt = stmt.order_by(Activity.activity_id).execution_options(
+        stream_results=True, yield_per=chunk_size
+    )
+    
+    def generate():
+        result = db.session.execute(stmt).mappings()
+        columns = list(result.keys())
+        if export_format == 'csv':
+            header = io.StringIO()
+            csv.writer(header).writerow(columns)
+            yield header.getvalue()
         
+        for rows in result.partitions():
+            buffer = io.StringIO()
+            if export_format == 'csv':
+                csv.DictWriter(buffer, fieldnames=columns).writerows(row_to_dict(row) for row in rows)
+            else:
+                for row in rows:
+                    buffer.write(current_app.json.dumps(dict(row)))
+                    buffer.write('\n')
+            yield buffer.getvalue()
+    
+    mimetype, filename = EXPORT_FORMATS[export_format]
+    response = current_app.response_class(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+# /api/activities filters a FacetCube cannot answer from its dimensions
+NON_CUBE_FILTER_ARGS = ('search', 'near', 'age', 'age_min', 'age_max')
+
+
+def get_facet_cube():
+    """FacetCube for the current dataset version, rebuilt only when it changes"""
+    version = get_dataset_version()
+    cube = get_caches().facet_cubes.get(version.tag)
+    if cube is None:
+        dimensions = [getattr(Activity, dimension) for dimension in FacetCube.DIMENSIONS]
+        cube = FacetCube(db.session.execute(
+            db.select(*dimensions, db.func.count())
+            .where(Activity.is_approved.is_(True), Activity.merged_into.is_(None))
+            .group_by(*dimensions)
+        ))
+        get_caches().facet_cubes.set(version.tag, cube)
+    return cube
+
+
+def build_filtered_facet_cube():
+    """FacetCube over the activities matching the request's search/age/near filters"""
+    dimensions = [getattr(Activity, dimension) for dimension in FacetCube.DIMENSIONS]
+    matching = filter_activities(db.select(Activity.activity_id), ranked=False, dimensions=False).subquery()
+    return FacetCube(db.session.execute(
+        db.select(*dimensions, db.func.count())
+        .select_from(Activity)
+        .join(matching, matching.c.activity_id == Activity.activity_id)
+        .group_by(*dimensions)
+    ))
+
+
+@api.route('/api/facets')
+def api_facets():
+    """API endpoint for filter sidebar counts
+
+    Returns category, suburb, postcode and source_name values with activity
+    counts for the filters given as query arguments. Counts come from an
+    in-memory FacetCube that is rebuilt whenever the dataset version moves
+    (a scrape commits or an approval changes), not per request. When
+    search, age or near filters are present, a cube over just the matching
+    activities is built from one filtered GROUP BY instead.
+    """
+    def build():
+        if any(request.args.get(arg) for arg in NON_CUBE_FILTER_ARGS):
+            cube = build_filtered_facet_cube()
+        else:
+            cube = get_facet_cube()
+        return cube.counts({
+            dimension: request.args.get(dimension, '') for dimension in FacetCube.DIMENSIONS
+        })
+
+    try:
+        return cached_json_response('facets', build)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ============================================================================
+# RECOMMENDATIONS
+# ============================================================================
+
+# Interaction weight of a favourite, and of an approved review by rating;
+# reviews below 3 stars are not treated as interest
+FAVOURITE_WEIGHT = 1.0
+REVIEW_WEIGHTS = {5: 1.0, 4: 0.8, 3: 0.4}
+
+
+def load_interactions(favourite_mark=0, review_mark=0):
+    """(user_id, activity_id, weight) for favourites and reviews past the given ids.
+
+    Returns the interactions and the new (favourite_mark, review_mark).
+    """
+    interactions = []
+    for favourite_id, user_id, activity_id in db.session.execute(
+        db.select(UserFavorite.favourite_id, UserFavorite.user_id, UserFavorite.activity_id)
+        .where(UserFavorite.favourite_id > favourite_mark)
+    ):
+        interactions.append((user_id, activity_id, FAVOURITE_WEIGHT))
+        favourite_mark = max(favourite_mark, favourite_id)
+    for review_id, user_id, activity_id, rating in db.session.execute(
+        db.select(UserReview.review_id, UserReview.user_id, UserReview.activity_id, UserReview.rating)
+        .where(UserReview.review_id > review_mark, UserReview.is_approved.is_(True))
+    ):
+        if rating in REVIEW_WEIGHTS:
+            interactions.append((user_id, activity_id, REVIEW_WEIGHTS[rating]))
+        review_mark = max(review_mark, review_id)
+    return interactions, (favourite_mark, review_mark)
+
+
+def build_recommender():
+    """(ItemSimilarity over every favourite and review, (favourite_mark, review_mark))"""
+    similarity = ItemSimilarity(neighbours=current_app.config['RECOMMENDER_NEIGHBOURS'])
+    interactions, marks = load_interactions()
+    similarity.update(interactions)
+    return similarity, marks
+
+
+def get_recommender():
+    """ItemSimilarity over every user's favourites and reviews.
+
+    The first call builds it inline. New favourites and reviews are folded
+    in incrementally, polled by id at most every RECOMMENDER_POLL_SECONDS.
+    Every RECOMMENDER_REBUILD_SECONDS a rebuild from scratch starts on a
+    background thread and the current model keeps serving until it is
+    swapped in.
+    """
+    state = get_caches().recommender
+    now = time.monotonic()
+    with state.lock:
+        if state.similarity is None:
+            state.similarity, (state.favourite_mark, state.review_mark) = build_recommender()
+            state.built_at = state.polled_at = now
+            return state.similarity
+
+        if not state.building and now - state.built_at >= current_app.config['RECOMMENDER_REBUILD_SECONDS']:
+            # Marked as built now so a failed rebuild is retried after another interval
+            state.building, state.built_at = True, now
+            app = current_app._get_current_object()
+            threading.Thread(target=_rebuild_recommender, args=(app, state), daemon=True).start()
+        elif now - state.polled_at >= current_app.config['RECOMMENDER_POLL_SECONDS']:
+            interactions, (state.favourite_mark, state.review_mark) = load_interactions(
+                state.favourite_mark, state.review_mark
+            )
+            state.similarity.update(interactions)
+            state.polled_at = now
+        return state.similarity
+
+
+def _rebuild_recommender(app, state):
+    with app.app_context():
+        try:
+            similarity, marks = build_recommender()
+            catalogue = get_recommendation_catalogue()
+            fallback = FallbackRanking(similarity.popular(), catalogue)
+            with state.lock:
+                # Interactions after the rebuild's marks are picked up by the next poll
+                state.similarity, (state.favourite_mark, state.review_mark) = similarity, marks
+                state.fallback = (similarity, catalogue, fallback)
+                state.built_at = state.polled_at = time.monotonic()
+        except Exception as e:
+            app.logger.warning(f'Recommender rebuild failed: {e}')
+        finally:
+            state.building = False
+
+
+def get_recommendation_fallback(similarity, catalogue):
+    """FallbackRanking of the model's popular activities and the catalogue.
+
+    Built once per model rebuild (on the rebuild thread) and when the
+    catalogue moves to a new dataset version; popularity from interactions
+    polled in between is picked up by the next rebuild.
+    """
+    state = get_caches().recommender
+    with state.lock:
+        cached = state.fallback
+    if cached is not None and cached[0] is similarity and cached[1] is catalogue:
+        return cached[2]
+    fallback = FallbackRanking(similarity.popular(), catalogue)
+    with state.lock:
+        state.fallback = (similarity, catalogue, fallback)
+    return fallback
+
+
+def get_recommendation_catalogue():
+    """{activity_id: ActivityProfile} of approved activities for the current dataset version"""
+    version = get_dataset_version()
+    catalogue = get_caches().recommendation_catalogues.get(version.tag)
+    if catalogue is None:
+        catalogue = {
+            row.activity_id: ActivityProfile(row.category, row.suburb, row.min_age, row.max_age)
+            for row in db.session.execute(
+                db.select(
+                    Activity.activity_id, Activity.category, Activity.suburb,
+                    Activity.min_age, Activity.max_age
+                ).where(Activity.is_approved.is_(True), Activity.merged_into.is_(None))
+            )
+        }
+        get_caches().recommendation_catalogues.set(version.tag, catalogue)
+    return catalogue
+
+
+@api.route('/api/recommendations/<int:user_id>')
+def api_recommendations(user_id):
+    """API endpoint for personalised activity recommendations
+
+    Ranks activities similar to the ones the user favourited or reviewed
+    (item-item co-occurrence across all users), topped up with popular
+    activities for users with little history, and boosts those matching the
+    user's preferred ``categories`` (preferences JSON), ``child_age_range``
+    and ``suburb``. ``limit`` defaults to 6.
+    """
+    try:
+        limit = min(max(request.args.get('limit', 6, type=int), 1), 50)
+        user = db.session.execute(
+            db.select(User.suburb, User.child_age_range, User.preferences)
+            .where(User.user_id == user_id, User.is_active.is_(True))
+        ).first()
+        if user is None:
+            return jsonify({'error': 'User not found'}), 404
+
+        min_age, max_age = parse_child_age_range(user.child_age_range)
+        profile = UserProfile(preferred_categories(user.preferences), user.suburb, min_age, max_age)
+        similarity = get_recommender()
+        fallback = get_recommendation_fallback(similarity, get_recommendation_catalogue())
+        ranked = recommend(similarity, user_id, fallback, profile, limit)
+
+        rows = {}
+        if ranked:
+            rows = {
+                row['activity_id']: dict(row)
+                for row in db.session.execute(
+                    select_activity_fields(DEFAULT_LIST_FIELDS).where(
+                        Activity.activity_id.in_([activity_id for activity_id, _, _ in ranked])
+                    )
+                ).mappings()
+            }
+
+        recommendations = []
+        for activity_id, score, reason in ranked:
+            if activity_id in rows:
+                recommendations.append({**rows[activity_id], 'score': round(score, 4), 'reason': reason})
         return jsonify({
-            'activities': [{
-                'activity_id': a.activity_id,
-                'title': a.title,
-                'description': a.description,
-                'category': a.category,
-                'suburb': a.suburb,
-                'postcode': a.postcode,
-                'image_url': a.image_url,
-                'age_range': a.age_range,
-                'cost': a.cost
-            } for a in activities],
-            'total': total,
-            'page': page,
-            'limit': limit
+            'user_id': user_id,
+            'recommendations': recommendations,
+            'count': len(recommendations)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/activity/<int:activity_id>')
-def api_activity_detail(activity_id):
-    """API endpoint for single activity details"""
+# ============================================================================
+# SUGGEST
+# ============================================================================
+
+def build_suggest_index():
+    """SuggestIndex over approved activity titles, categories and location suburbs.
+
+    Titles are weighted by favourites plus approved reviews, categories and
+    suburbs by their number of approved activities.
+    """
+    interest = dict(db.session.execute(
+        db.select(UserFavorite.activity_id, db.func.count()).group_by(UserFavorite.activity_id)
+    ).all())
+    for activity_id, count in db.session.execute(
+        db.select(ActivityRatingStats.activity_id, ActivityRatingStats.rating_count)
+    ):
+        interest[activity_id] = interest.get(activity_id, 0) + count
+
+    entries = []
+    category_counts, suburb_counts = {}, {}
+    for activity_id, title, category, suburb in db.session.execute(
+        db.select(Activity.activity_id, Activity.title, Activity.category, Activity.suburb)
+        .where(Activity.is_approved.is_(True), Activity.merged_into.is_(None))
+    ):
+        entries.append((title, 'activity', interest.get(activity_id, 0), {'activity_id': activity_id}))
+        if category:
+            category_counts[category] = category_counts.get(category, 0) + 1
+        if suburb:
+            suburb_counts[suburb.lower()] = suburb_counts.get(suburb.lower(), 0) + 1
+
+    for (category_name,) in db.session.execute(db.select(Category.category_name)):
+        category_counts.setdefault(category_name, 0)
+    entries.extend(
+        (category, 'category', count, {'count': count}) for category, count in category_counts.items()
+    )
+    for (suburb,) in db.session.execute(db.select(Location.suburb).distinct()):
+        count = suburb_counts.get(suburb.lower(), 0)
+        entries.append((suburb, 'suburb', count, {'count': count}))
+
+    return SuggestIndex(entries)
+
+
+def get_suggest_index():
+    """SuggestIndex for the current dataset version.
+
+    The first call builds it inline. After that, a version change starts a
+    rebuild on a background thread and the previous index keeps serving
+    until the new one is ready.
+    """
+    state = get_caches().suggest
+    version = get_dataset_version()
+    with state.lock:
+        if state.index is not None and (state.tag == version.tag or state.building):
+            return state.index
+        if state.index is not None:
+            state.building = True
+            app = current_app._get_current_object()
+            threading.Thread(
+                target=_rebuild_suggest_index, args=(app, state, version.tag), daemon=True
+            ).start()
+            return state.index
+
+        state.index, state.tag = build_suggest_index(), version.tag
+        return state.index
+
+
+def _rebuild_suggest_index(app, state, tag):
+    with app.app_context():
+        try:
+            index = build_suggest_index()
+            with state.lock:
+                state.index, state.tag = index, tag
+        except Exception as e:
+            app.logger.warning(f'Suggest index rebuild failed: {e}')
+        finally:
+            state.building = False
+
+
+@api.route('/api/suggest')
+def api_suggest():
+    """API endpoint for search box typeahead
+
+    Returns up to ``limit`` (default 8) activity titles, categories and
+    suburbs with a word starting with ``q``, most popular first, from an
+    in-memory prefix index rather than a LIKE query per keystroke.
+    """
     try:
-        activity = Activity.query.filter_by(
-            activity_id=activity_id, 
-            is_approved=True
-        ).first_or_404()
-        
+        query = request.args.get('q', '')
+        limit = min(max(request.args.get('limit', 8, type=int), 1), 20)
+        return jsonify({
+            'query': query,
+            'suggestions': get_suggest_index().suggest(query, limit)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# ============================================================================
+# FAVOURITES
+# ============================================================================
+
+# Live activity columns returned for each favourite
+FAVOURITE_FIELDS = (
+    'activity_id', 'title', 'category', 'suburb', 'postcode', 'image_url', 'age_range'
+)
+
+
+def get_activity_summaries(ids):
+    """{activity_id: FAVOURITE_FIELDS dict, or None if not approved} for ids.
+
+    Ids merged into another activity get the canonical activity's summary.
+    Summaries are cached per activity and dataset version; the ids not in
+    the cache are resolved and fetched with one IN query each.
+    """
+    version = get_dataset_version()
+    cache = get_caches().activity_summaries
+    summaries, missing = {}, []
+    for activity_id in ids:
+        summary = cache.get((version.tag, activity_id), False)
+        if summary is False:
+            missing.append(activity_id)
+        else:
+            summaries[activity_id] = summary
+
+    if missing:
+        merged = get_canonical_ids(missing)
+        targets = {activity_id: merged.get(activity_id, activity_id) for activity_id in missing}
+        found = {
+            row['activity_id']: dict(row)
+            for row in db.session.execute(
+                select_activity_fields(FAVOURITE_FIELDS).where(
+                    Activity.activity_id.in_(set(targets.values())),
+                    Activity.is_approved.is_(True),
+                    Activity.merged_into.is_(None)
+                )
+            ).mappings()
+        }
+        for activity_id in missing:
+            summaries[activity_id] = found.get(targets[activity_id])
+            cache.set((version.tag, activity_id), summaries[activity_id])
+    return summaries
+
+
+@api.route('/api/users/<int:user_id>/favourites')
+def api_user_favourites(user_id):
+    """API endpoint for a user's favourites with live activity data
+
+    Favourites come back newest first with the activity's current title,
+    category, suburb etc. from kidssmart_app rather than the copies stored
+    in the favourites table. Favourites whose activity was removed or
+    unapproved are listed under ``missing`` with the stored title.
+    """
+    try:
+        favourites = db.session.execute(
+            db.select(
+                UserFavorite.favourite_id, UserFavorite.activity_id,
+                UserFavorite.activity_title, UserFavorite.created_at
+            )
+            .where(UserFavorite.user_id == user_id)
+            .order_by(UserFavorite.created_at.desc(), UserFavorite.favourite_id.desc())
+        ).all()
+        summaries = get_activity_summaries(list(dict.fromkeys(
+            favourite.activity_id for favourite in favourites
+        )))
+
+        activities, missing = [], []
+        for favourite in favourites:
+            summary = summaries[favourite.activity_id]
+            if summary is None:
+                missing.append({
+                    'favourite_id': favourite.favourite_id,
+                    'activity_id': favourite.activity_id,
+                    'activity_title': favourite.activity_title
+                })
+            else:
+                activities.append({
+                    **summary,
+                    'favourite_id': favourite.favourite_id,
+                    'created_at': favourite.created_at.isoformat() if favourite.created_at else None
+                })
         return jsonify({
-            'activity_id': activity.activity_id,
-            'title': activity.title,
-            'description': activity.description,
-            'category': activity.category,
-            'suburb': activity.suburb,
-            'postcode': activity.postcode,
-            'address': activity.address,
-            'phone': activity.phone,
-            'email': activity.email,
-            'website': activity.website,
-            'age_range': activity.age_range,
-            'cost': activity.cost,
-            'schedule': activity.schedule,
-            'image_url': activity.image_url,
-            'source_name': activity.source_name,
-            'scraped_at': activity.scraped_at.isoformat() if activity.scraped_at else None
+            'user_id': user_id,
+            'favourites': activities,
+            'missing': missing,
+            'count': len(activities)
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -273,6 +1967,7 @@ def api_activity_detail(activity_id):
 
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
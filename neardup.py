@@ -0,0 +1,154 @@
+import re
+import zlib
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+WORD_RE = re.compile(r'\w+')
+
+# Words that differ between listings of the same provider without changing
+# what it is ("The Little Stars Dance Studio Pty Ltd")
+NAME_STOPWORDS = frozenset({'the', 'and', 'of', 'for', 'at', 'in', 'inc', 'pty', 'ltd', 'co'})
+
+# Only the start of a description is shingled; sources that copy a
+# provider's blurb agree there, and long descriptions stay cheap to hash
+DESCRIPTION_WORDS = 120
+
+# Share of a pair's score that comes from the name when both have a description
+NAME_WEIGHT = 0.7
+
+# LSH buckets with more members than this are skipped rather than compared
+# pairwise (boilerplate shared by one source's whole catalogue)
+MAX_BUCKET_SIZE = 50
+
+Record = namedtuple('Record', ['activity_id', 'title', 'description', 'suburb', 'postcode'])
+Match = namedtuple('Match', ['left', 'right', 'similarity'])
+
+
+def normalise_name(title):
+    """Lower-cased words of a title without NAME_STOPWORDS"""
+    return ' '.join(word for word in WORD_RE.findall((title or '').casefold()) if word not in NAME_STOPWORDS)
+
+
+def block_key(record):
+    """Location activities must share to be compared: postcode, else suburb"""
+    postcode = (record.postcode or '').strip()
+    if postcode:
+        return postcode
+    return ' '.join(WORD_RE.findall((record.suburb or '').casefold()))
+
+
+def name_shingles(title):
+    """Character trigrams of the normalised name, padded so short names still shingle"""
+    name = f' {normalise_name(title)} '
+    return {name[i:i + 3] for i in range(len(name) - 2)} if name.strip() else set()
+
+
+def description_shingles(description):
+    """Word trigrams of the start of a description"""
+    words = WORD_RE.findall((description or '').casefold())[:DESCRIPTION_WORDS]
+    if len(words) < 3:
+        return set(words)
+    return {' '.join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+class MinHasher:
+    """MinHash signatures of shingle sets.
+
+    Each of ``permutations`` hash functions is a multiply-shift hash of the
+    shingle's CRC32; the fraction of positions where two signatures agree
+    estimates the Jaccard similarity of their shingle sets.
+    """
+
+    def __init__(self, permutations=128, seed=1):
+        rng = np.random.default_rng(seed)
+        self.permutations = permutations
+        self.multipliers = rng.integers(1, 2 ** 63, permutations, dtype=np.uint64) | np.uint64(1)
+        self.increments = rng.integers(0, 2 ** 63, permutations, dtype=np.uint64)
+
+    def signature(self, shingles):
+        """uint32 array of ``permutations`` minimums, or None for an empty set"""
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles), dtype=np.uint64)
+        # uint64 arithmetic wraps, which is the multiply-shift hash we want
+        with np.errstate(over='ignore'):
+            values = np.outer(hashes, self.multipliers) + self.increments
+        return (values >> np.uint64(32)).min(axis=0).astype(np.uint32)
+
+
+def similarity(left, right):
+    return float(np.count_nonzero(left == right)) / len(left)
+
+
+def find_duplicates(records, threshold=0.7, permutations=128, bands=32):
+    """Matches between records that are likely the same activity.
+
+    Records are only compared with others in the same block_key (postcode
+    or suburb). Candidates are pairs that share a block and an LSH band of
+    their name or description signature, or have the same normalised name;
+    each record lands in a fixed number of buckets, so the work grows with
+    the catalogue rather than with the number of pairs. A candidate matches
+    when its score reaches ``threshold``: the estimated name similarity,
+    blended with description similarity (NAME_WEIGHT) when both records
+    have one.
+    """
+    hasher = MinHasher(permutations)
+    rows = permutations // bands
+    names = {}
+    descriptions = {}
+    buckets = defaultdict(list)
+
+    for record in records:
+        block = block_key(record)
+        name_signature = hasher.signature(name_shingles(record.title))
+        if name_signature is None:
+            continue
+        description_signature = hasher.signature(description_shingles(record.description))
+        names[record.activity_id] = name_signature
+        descriptions[record.activity_id] = description_signature
+
+        buckets[(block, 'exact', normalise_name(record.title))].append(record.activity_id)
+        for kind, signature in (('name', name_signature), ('description', description_signature)):
+            if signature is None:
+                continue
+            for band in range(bands):
+                key = signature[band * rows:(band + 1) * rows].tobytes()
+                buckets[(block, kind, band, key)].append(record.activity_id)
+
+    candidates = set()
+    for members in buckets.values():
+        if len(members) < 2 or len(members) > MAX_BUCKET_SIZE:
+            continue
+        for i, left in enumerate(members):
+            for right in members[i + 1:]:
+                candidates.add((left, right) if left < right else (right, left))
+
+    matches = []
+    for left, right in candidates:
+        score = similarity(names[left], names[right])
+        if descriptions[left] is not None and descriptions[right] is not None:
+            score = NAME_WEIGHT * score + (1 - NAME_WEIGHT) * similarity(descriptions[left], descriptions[right])
+        if score >= threshold:
+            matches.append(Match(left, right, round(score, 3)))
+    return sorted(matches)
+
+
+def group_matches(matches):
+    """Connected groups of matched activity ids, each sorted, via union-find"""
+    parent = {}
+
+    def find(activity_id):
+        parent.setdefault(activity_id, activity_id)
+        while parent[activity_id] != activity_id:
+            parent[activity_id] = parent[parent[activity_id]]
+            activity_id = parent[activity_id]
+        return activity_id
+
+    for left, right, _ in matches:
+        parent[find(left)] = find(right)
+
+    groups = defaultdict(list)
+    for activity_id in list(parent):
+        groups[find(activity_id)].append(activity_id)
+    return sorted(sorted(group) for group in groups.values())
@@ -0,0 +1,74 @@
+import re
+from collections import Counter, defaultdict
+
+# Table names following FROM / JOIN / UPDATE / INTO in a SQL statement
+TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+[`"]?(\w+)[`"]?', re.IGNORECASE)
+
+
+class QueryDebugError(RuntimeError):
+    """Raised at the end of a request that repeated statements in raise mode"""
+
+
+class QueryLog:
+    """Statements executed while serving one request.
+
+    ``models`` maps table names to the model names reports should use;
+    statements on other tables are still recorded but reported by table.
+    """
+
+    def __init__(self, models):
+        self.models = models
+        self.statements = []
+        self.lazy_loads = Counter()
+
+    def record(self, bind, statement, parameters, elapsed):
+        self.statements.append((bind, statement, parameters, elapsed))
+
+    def record_lazy_load(self, relationship):
+        self.lazy_loads[relationship] += 1
+
+    @property
+    def seconds(self):
+        return sum(elapsed for _, _, _, elapsed in self.statements)
+
+    def tables(self, statement):
+        return sorted({self.models.get(table, table) for table in TABLE_RE.findall(statement)})
+
+    def repeated(self, threshold):
+        """Statements whose SQL text ran at least ``threshold`` times.
+
+        Lazy loads through a relationship run the same SQL with a different
+        key each time, so the parameters are ignored when grouping; runs
+        that were also identical in their parameters are counted separately
+        as duplicates.
+        """
+        by_statement = defaultdict(list)
+        for bind, statement, parameters, _ in self.statements:
+            by_statement[(bind, statement)].append(repr(parameters))
+
+        repeats = []
+        for (bind, statement), parameters in by_statement.items():
+            if len(parameters) >= threshold:
+                repeats.append({
+                    'bind': bind,
+                    'statement': statement,
+                    'count': len(parameters),
+                    'duplicates': len(parameters) - len(set(parameters)),
+                    'models': self.tables(statement),
+                })
+        repeats.sort(key=lambda repeat: repeat['count'], reverse=True)
+        return repeats
+
+    def slow(self, threshold_seconds):
+        """(bind, statement, parameters, elapsed) for statements at or above the threshold"""
+        return [entry for entry in self.statements if entry[3] >= threshold_seconds]
+
+
+def explain(engine, statement, parameters):
+    """Query plan for a SELECT, run on a fresh connection; None for other statements"""
+    if isinstance(parameters, list) or not statement.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    with engine.connect() as connection:
+        result = connection.exec_driver_sql(prefix + statement, parameters)
+        return [dict(row) for row in result.mappings()]
@@ -0,0 +1,305 @@
+import re
+import threading
+from collections import namedtuple
+
+import numpy as np
+from scipy import sparse
+
+# Upper age stored for open-ended ranges, as activities.max_age does
+OPEN_MAX_AGE = 99
+
+ActivityProfile = namedtuple('ActivityProfile', ['category', 'suburb', 'min_age', 'max_age'])
+UserProfile = namedtuple('UserProfile', ['categories', 'suburb', 'min_age', 'max_age'])
+
+# Multipliers applied on top of the similarity / popularity score
+CATEGORY_BOOST = 1.5
+SUBURB_BOOST = 1.2
+AGE_MATCH_BOOST = 1.3
+AGE_MISMATCH_PENALTY = 0.3
+
+# Share of the score a most-popular activity gets from popularity alone
+POPULARITY_WEIGHT = 0.1
+
+# Base score of an activity recommended on profile match alone
+PROFILE_WEIGHT = 0.01
+
+
+class ItemSimilarity:
+    """Item-item cosine similarity over a sparse user x activity interaction matrix.
+
+    The co-occurrence matrix C = XᵀX is maintained incrementally: folding in a
+    batch of new interactions D adds XᵀD + DᵀX + DᵀD to C instead of
+    recomputing it, and only invalidates the neighbour lists of activities
+    that share a user with the batch. Each activity's top ``neighbours``
+    similar activities are computed on first use and kept until invalidated.
+    """
+
+    def __init__(self, neighbours=50):
+        self.neighbours = neighbours
+        self.users = {}
+        self.items = {}
+        self.item_ids = []
+        self.interactions = sparse.csr_matrix((0, 0))
+        self.cooccurrence = sparse.csr_matrix((0, 0))
+        self._norms = np.zeros(0)
+        self._top = {}
+        self._popular = None
+        self._lock = threading.Lock()
+
+    def update(self, interactions):
+        """Fold in (user_id, activity_id, weight) triples.
+
+        A user/activity pair keeps the highest weight seen for it, so a
+        favourite followed by a review of the same activity counts once.
+        Returns the number of pairs whose weight changed.
+        """
+        interactions = list(interactions)
+        if not interactions:
+            return 0
+        with self._lock:
+            count = len(interactions)
+            rows = np.fromiter(
+                (self._index(self.users, user_id) for user_id, _, _ in interactions), dtype=np.int64, count=count
+            )
+            columns = np.fromiter(
+                (self._item_column(activity_id) for _, activity_id, _ in interactions), dtype=np.int64, count=count
+            )
+            weights = np.fromiter((weight for _, _, weight in interactions), dtype=float, count=count)
+
+            shape = (len(self.users), len(self.items))
+            self.interactions.resize(shape)
+            self.cooccurrence.resize((shape[1], shape[1]))
+
+            # Keep the highest weight per pair: sort by pair then weight and
+            # take the last entry of each pair
+            keys = rows * shape[1] + columns
+            order = np.lexsort((weights, keys))
+            keys, rows, columns, weights = keys[order], rows[order], columns[order], weights[order]
+            last = np.append(keys[1:] != keys[:-1], True)
+            rows, columns, weights = rows[last], columns[last], weights[last]
+
+            # Compare against the stored weights in one fancy-indexed lookup
+            current = np.asarray(self.interactions[rows, columns]).ravel()
+            changed = weights > current
+            if not changed.any():
+                return 0
+            rows, columns = rows[changed], columns[changed]
+            deltas = weights[changed] - current[changed]
+
+            delta = sparse.csr_matrix((deltas, (rows, columns)), shape=shape)
+            cross = (self.interactions.T @ delta).tocsr()
+            self.cooccurrence = (self.cooccurrence + cross + cross.T + delta.T @ delta).tocsr()
+            self.interactions = (self.interactions + delta).tocsr()
+            self._norms = np.sqrt(self.cooccurrence.diagonal())
+
+            # Only rows for activities sharing a user with the batch changed
+            for column in np.unique(self.interactions[np.unique(rows)].indices):
+                self._top.pop(column, None)
+            self._popular = None
+            return len(deltas)
+
+    def neighbours_of(self, activity_id):
+        """[(activity_id, similarity)] most similar first, at most ``neighbours`` long"""
+        column = self.items.get(activity_id)
+        if column is None:
+            return []
+        with self._lock:
+            top = self._top.get(column)
+            if top is None:
+                row = self.cooccurrence.getrow(column)
+                keep = row.indices != column
+                indices = row.indices[keep]
+                scores = row.data[keep] / (self._norms[column] * self._norms[indices])
+                if len(scores) > self.neighbours:
+                    best = np.argpartition(-scores, self.neighbours)[:self.neighbours]
+                    indices, scores = indices[best], scores[best]
+                order = np.argsort(-scores, kind='stable')
+                top = [(self.item_ids[indices[i]], float(scores[i])) for i in order]
+                self._top[column] = top
+            return top
+
+    def user_items(self, user_id):
+        """{activity_id: weight} the user has favourited or reviewed"""
+        row = self.users.get(user_id)
+        if row is None:
+            return {}
+        with self._lock:
+            interactions = self.interactions.getrow(row)
+            return {
+                self.item_ids[column]: float(weight)
+                for column, weight in zip(interactions.indices, interactions.data)
+            }
+
+    def popular(self):
+        """[(activity_id, users)] by number of users who interacted, most first"""
+        with self._lock:
+            if self._popular is None:
+                users = np.diff(self.interactions.tocsc().indptr)
+                order = np.argsort(-users, kind='stable')
+                self._popular = [(self.item_ids[i], int(users[i])) for i in order if users[i]]
+            return self._popular
+
+    def _item_column(self, activity_id):
+        column = self._index(self.items, activity_id)
+        if column == len(self.item_ids):
+            self.item_ids.append(activity_id)
+        return column
+
+    @staticmethod
+    def _index(mapping, key):
+        return mapping.setdefault(key, len(mapping))
+
+
+def parse_child_age_range(age_range):
+    """(min_age, max_age) for a profile's child_age_range such as "4-6 years" or "13+" """
+    numbers = [int(number) for number in re.findall(r'\d+', age_range or '')]
+    if not numbers:
+        return None, None
+    if len(numbers) == 1:
+        return numbers[0], OPEN_MAX_AGE if '+' in age_range else numbers[0]
+    return min(numbers[:2]), max(numbers[:2])
+
+
+def preferred_categories(preferences):
+    """Lower-cased category names from preferences JSON ``{"categories": [...]}``"""
+    if not isinstance(preferences, dict):
+        return frozenset()
+    categories = preferences.get('categories') or []
+    if isinstance(categories, str):
+        categories = categories.split(',')
+    return frozenset(str(category).strip().lower() for category in categories if str(category).strip())
+
+
+def profile_boost(activity, profile):
+    """Multiplier for how well an activity suits the user's profile"""
+    boost = 1.0
+    if activity.category and activity.category.lower() in profile.categories:
+        boost *= CATEGORY_BOOST
+    if activity.suburb and profile.suburb and activity.suburb.lower() == profile.suburb.lower():
+        boost *= SUBURB_BOOST
+    if None not in (activity.min_age, activity.max_age, profile.min_age, profile.max_age):
+        if activity.min_age <= profile.max_age and activity.max_age >= profile.min_age:
+            boost *= AGE_MATCH_BOOST
+        else:
+            boost *= AGE_MISMATCH_PENALTY
+    return boost
+
+
+class FallbackRanking:
+    """Popular and profile-matching activities for users with too little history.
+
+    Built once per model update and catalogue: popularity scores, categories,
+    suburbs and age bounds of every candidate are held in arrays, so ranking
+    them for a profile is a vectorised profile_boost followed by an
+    argpartition for the top ``limit``, not a sort of the whole catalogue.
+    ``activities`` is the {activity_id: ActivityProfile} catalogue.
+    """
+
+    def __init__(self, popular, activities):
+        self.popular = popular
+        self.activities = activities
+        top_users = popular[0][1] if popular else 1
+        self.popularity = {activity_id: POPULARITY_WEIGHT * users / top_users for activity_id, users in popular}
+
+        self.positions = {activity_id: position for position, activity_id in enumerate(activities)}
+        self.activity_ids = np.fromiter(activities, dtype=np.int64, count=len(activities))
+        self.popularity_scores = np.array([self.popularity.get(activity_id, 0.0) for activity_id in activities])
+        self.is_popular = self.popularity_scores > 0
+        self._categories, self._suburbs = {}, {}
+        self.category_codes = np.array(
+            [self._code(self._categories, activity.category) for activity in activities.values()], dtype=np.int64
+        )
+        self.suburb_codes = np.array(
+            [self._code(self._suburbs, activity.suburb) for activity in activities.values()], dtype=np.int64
+        )
+        self.min_ages = np.array([np.nan if activity.min_age is None else activity.min_age
+                                  for activity in activities.values()], dtype=float)
+        self.max_ages = np.array([np.nan if activity.max_age is None else activity.max_age
+                                  for activity in activities.values()], dtype=float)
+
+    @staticmethod
+    def _code(codes, value):
+        if not value:
+            return -1
+        return codes.setdefault(value.lower(), len(codes))
+
+    def boosts(self, profile):
+        """profile_boost of every candidate, as an array"""
+        boosts = np.ones(len(self.activity_ids))
+        categories = [self._categories[category] for category in profile.categories if category in self._categories]
+        if categories:
+            # Lookup table by category code; the trailing entry catches -1 (no category)
+            preferred = np.zeros(len(self._categories) + 1, dtype=bool)
+            preferred[categories] = True
+            boosts[preferred[self.category_codes]] *= CATEGORY_BOOST
+        if profile.suburb and profile.suburb.lower() in self._suburbs:
+            boosts[self.suburb_codes == self._suburbs[profile.suburb.lower()]] *= SUBURB_BOOST
+        if profile.min_age is not None and profile.max_age is not None:
+            known = ~(np.isnan(self.min_ages) | np.isnan(self.max_ages))
+            with np.errstate(invalid='ignore'):
+                overlap = (self.min_ages <= profile.max_age) & (self.max_ages >= profile.min_age)
+            boosts[known & overlap] *= AGE_MATCH_BOOST
+            boosts[known & ~overlap] *= AGE_MISMATCH_PENALTY
+        return boosts
+
+    def rank(self, profile, limit, exclude=()):
+        """[(activity_id, score, reason)]: popular activities, then the best profile matches"""
+        boosts = self.boosts(profile)
+        available = np.ones(len(self.activity_ids), dtype=bool)
+        for activity_id in exclude:
+            position = self.positions.get(activity_id)
+            if position is not None:
+                available[position] = False
+
+        results = []
+        for reason, base, candidates in (
+            ('popular', 0.0, self.is_popular),
+            ('profile', PROFILE_WEIGHT, None),
+        ):
+            if len(results) >= limit:
+                break
+            scores = (base + self.popularity_scores) * boosts
+            mask = available if candidates is None else available & candidates
+            for position in _top(scores, mask, limit - len(results)):
+                results.append((int(self.activity_ids[position]), float(scores[position]), reason))
+                available[position] = False
+        return results
+
+
+def _top(scores, mask, limit):
+    """Positions of the ``limit`` highest scores where mask is set, best first"""
+    positions = np.flatnonzero(mask)
+    if len(positions) > limit:
+        positions = positions[np.argpartition(-scores[positions], limit - 1)[:limit]]
+    return positions[np.lexsort((positions, -scores[positions]))]
+
+
+def recommend(similarity, user_id, fallback, profile, limit):
+    """Top ``limit`` [(activity_id, score, reason)] for a user.
+
+    Activities similar to the ones the user already favourited or reviewed
+    come first (reason ``similar``). Users with too little history are
+    topped up from ``fallback`` (a FallbackRanking of the model's popular
+    activities and the candidate catalogue): popular activities, then the
+    best profile matches. Activities the user already has are never
+    recommended.
+    """
+    seen = similarity.user_items(user_id)
+    activities = fallback.activities
+
+    scores = {}
+    for activity_id, weight in seen.items():
+        for neighbour, score in similarity.neighbours_of(activity_id):
+            scores[neighbour] = scores.get(neighbour, 0.0) + weight * score
+
+    results = []
+    for activity_id, score in scores.items():
+        if activity_id in activities and activity_id not in seen:
+            score += fallback.popularity.get(activity_id, 0.0)
+            results.append((activity_id, score * profile_boost(activities[activity_id], profile), 'similar'))
+    results = sorted(results, key=lambda result: result[1], reverse=True)[:limit]
+
+    if len(results) < limit:
+        chosen = set(seen).union(activity_id for activity_id, _, _ in results)
+        results += fallback.rank(profile, limit - len(results), exclude=chosen)
+    return results
@@ -0,0 +1,55 @@
+import gzip
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - the stdlib encoder is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - only gzip is offered
+    brotli = None
+
+# Content-Encodings we can produce, in order of preference
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that serialises with orjson when it is installed.
+
+    Datetimes and dates are written as ISO 8601 by both orjson and the
+    stdlib fallback, so rows can be returned as-is without converting each
+    value first. Keys are sorted like Flask's default provider. Indented
+    output (debug mode) and custom json.dumps arguments use the stdlib.
+    """
+
+    ORJSON_OPTIONS = (
+        orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if orjson is not None else 0
+    )
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'separators'}:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self.ORJSON_OPTIONS).decode()
+
+
+def negotiate_encoding(accept_encodings):
+    """Best of ENCODINGS the client accepts, or None for an uncompressed body"""
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def compress(data, encoding, gzip_level=6, brotli_quality=5):
+    """Encode bytes with 'gzip' or 'br'"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
@@ -0,0 +1,73 @@
+import bisect
+import heapq
+import re
+import threading
+
+WORD_RE = re.compile(r'\w+')
+
+# Prefixes this short match most of the index, so their results are memoised
+MEMOISED_PREFIX_LENGTH = 2
+
+
+def normalise(text):
+    """Lower-cased words of text joined by single spaces"""
+    return ' '.join(WORD_RE.findall(text.casefold()))
+
+
+class SuggestIndex:
+    """Prefix index over suggestion texts, ranked by weight.
+
+    ``entries`` are (text, kind, weight, extra) tuples; ``extra`` is a dict
+    merged into the suggestion (e.g. an activity_id). Each entry is indexed
+    under every word start, so "soc" finds "Junior Soccer Club". Keys are
+    kept in one sorted list and a prefix lookup is a bisect to the first
+    match followed by a scan of the matching run.
+    """
+
+    def __init__(self, entries):
+        self.suggestions = []
+        keys = []
+        seen = set()
+        for text, kind, weight, extra in entries:
+            words = normalise(text).split()
+            if not words or (kind, text) in seen:
+                continue
+            seen.add((kind, text))
+            position = len(self.suggestions)
+            self.suggestions.append((weight, {'text': text, 'type': kind, **extra}))
+            for start in range(len(words)):
+                keys.append((' '.join(words[start:]), position))
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._positions = [position for _, position in keys]
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.suggestions)
+
+    def suggest(self, query, limit=8):
+        """Up to ``limit`` suggestions starting with query, heaviest first"""
+        prefix = normalise(query)
+        if not prefix:
+            return []
+        if len(prefix) <= MEMOISED_PREFIX_LENGTH:
+            with self._lock:
+                cached = self._memo.get((prefix, limit))
+            if cached is None:
+                cached = self._search(prefix, limit)
+                with self._lock:
+                    self._memo[(prefix, limit)] = cached
+            return cached
+        return self._search(prefix, limit)
+
+    def _search(self, prefix, limit):
+        start = bisect.bisect_left(self._keys, prefix)
+        # Every key starting with prefix sorts before prefix + the largest code point
+        end = bisect.bisect_left(self._keys, prefix + '\U0010ffff', lo=start)
+        positions = set(self._positions[start:end])
+        best = heapq.nsmallest(
+            limit, positions,
+            key=lambda position: (-self.suggestions[position][0], position)
+        )
+        return [self.suggestions[position][1] for position in best]